@@ -1,11 +1,22 @@
 import pandas as pd
 import numpy as np
 from io import BytesIO
-import xlsxwriter
-import plotly.graph_objects as go
-import plotly.io as pio
-from PIL import Image
-import base64
+
+
+def write_dataframe_rows(worksheet, df, header_format=None, chunk_size=50000):
+    """
+    Write a DataFrame to an xlsxwriter worksheet row by row: the header, then the
+    data in bounded chunks. Unlike to_excel this builds no formatted cell object
+    per value and also works in constant_memory mode; missing values become
+    blank cells as with to_excel
+    """
+    worksheet.write_row(0, 0, df.columns.tolist(), header_format)
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        for row_num, row in enumerate(chunk.itertuples(index=False, name=None), start=start + 1):
+            worksheet.write_row(row_num, 0, row)
+
 
 class ExcelExporter:
     """
@@ -13,17 +24,71 @@ class ExcelExporter:
     """
     
     def __init__(self, filtered_data, all_data, figures, selected_year, selected_region):
-        self.filtered_data = filtered_data
+        # Low-cardinality text columns are compared and grouped repeatedly below;
+        # as categoricals those operations run on small integer codes
+        category_columns = ['INET_ELIGIBLE', 'iNET_Registration_status', 'Activity_Status', 'REGION_DESC']
+        self.filtered_data = filtered_data.astype(
+            {col: 'category' for col in category_columns if col in filtered_data.columns}
+        )
         self.all_data = all_data
         self.figures = figures
         self.selected_year = selected_year
         self.selected_region = selected_region
         self.output = BytesIO()
         
+        # Evaluate each KPI condition once as a boolean array; the onboarding
+        # subset and the counts below all start from these
+        self._elig_mask = (self.filtered_data['INET_ELIGIBLE'] == 'Y').to_numpy()
+        self._reg_mask = (self.filtered_data['iNET_Registration_status'] == 'Registered').to_numpy()
+        
+        # Region codes (-1 for a missing region) and their labels, shared by the
+        # per-region breakdowns
+        region = self.filtered_data['REGION_DESC']
+        self._region_codes = region.cat.codes.to_numpy()
+        self._region_categories = region.cat.categories
+        
+        # Activity as a level per row: 0 inactive, 1 biweekly/monthly active,
+        # 2 weekly active. The lookup has a trailing 0 so code -1 (missing) maps to it
+        activity = self.filtered_data['Activity_Status'].cat
+        activity_levels = {'Weekly Active': 2, 'Biweekly Active': 1, 'Monthly Active': 1}
+        level_by_code = np.array([activity_levels.get(c, 0) for c in activity.categories] + [0], dtype=np.int64)
+        activity_level = level_by_code[activity.codes.to_numpy()]
+        
+        # Every count the summary and funnel sheets need comes from one bincount
+        # over a combined (region, eligible, registered, activity) key; missing
+        # regions go in slot 0, so region code r lands in slot r + 1
+        n_slots = len(self._region_categories) + 1
+        key = (((self._region_codes.astype(np.int64) + 1) * 2 + self._elig_mask) * 2 + self._reg_mask) * 3 + activity_level
+        counts = np.bincount(key, minlength=n_slots * 12).reshape(n_slots, 2, 2, 3)
+        
+        self._counts = {
+            'total': len(self.filtered_data),
+            'eligible': int(counts[:, 1].sum()),
+            'registered': int(counts[:, :, 1].sum()),
+            'active_30': int(counts[..., 1:].sum()),
+            'weekly_active': int(counts[..., 2].sum())
+        }
+        # Per region (in category order): total, eligible, registered
+        self._region_counts = np.column_stack([
+            counts[1:].sum(axis=(1, 2, 3)),
+            counts[1:, 1].sum(axis=(1, 2)),
+            counts[1:, :, 1].sum(axis=(1, 2))
+        ])
+        
     def create_excel_report(self):
         """Main method to create the Excel report"""
-        with pd.ExcelWriter(self.output, engine='xlsxwriter') as writer:
+        # Customer_Data is streamed row by row (see _create_data_sheets), so the
+        # workbook carries the date format pandas would otherwise apply per cell,
+        # and skips the URL/formula regex checks on every string it writes
+        workbook_options = {
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+            'strings_to_urls': False,
+            'strings_to_formulas': False
+        }
+        with pd.ExcelWriter(self.output, engine='xlsxwriter',
+                            engine_kwargs={'options': workbook_options}) as writer:
             self.workbook = writer.book
+            self._fmt = self._build_formats()
             
             # Create sheets
             self._create_summary_sheet(writer)
@@ -31,44 +96,65 @@ class ExcelExporter:
             self._create_analysis_sheets(writer)
             self._create_comparison_sheets(writer)
             
+        # The report is complete; drop the input frames and cached arrays so a
+        # caller holding on to the exporter only keeps the output buffer alive
+        for attr in ('filtered_data', 'all_data', 'figures', 'workbook', '_fmt',
+                     '_elig_mask', '_reg_mask', '_region_codes', '_region_categories',
+                     '_counts', '_region_counts'):
+            setattr(self, attr, None)
+        
         self.output.seek(0)
         return self.output
     
+    def _build_formats(self):
+        """Register the workbook's cell formats once for all sheets"""
+        return {
+            'title': self.workbook.add_format({
+                'bold': True, 
+                'font_size': 18,
+                'font_color': '#1f4788',
+                'align': 'center'
+            }),
+            'header': self.workbook.add_format({
+                'bold': True,
+                'font_size': 14,
+                'font_color': '#1f4788',
+                'bottom': 2
+            }),
+            'label': self.workbook.add_format({
+                'bold': True,
+                'font_size': 11,
+                'bg_color': '#E8F0FE'
+            }),
+            'value': self.workbook.add_format({
+                'font_size': 11,
+                'num_format': '#,##0'
+            }),
+            'pct': self.workbook.add_format({
+                'font_size': 11,
+                'num_format': '0.0%'
+            }),
+            'data_header': self.workbook.add_format({
+                'bold': True,
+                'bg_color': '#1f4788',
+                'font_color': 'white',
+                'align': 'center'
+            }),
+            'num2': self.workbook.add_format({'num_format': '0.00'}),
+            'pct2': self.workbook.add_format({'num_format': '0.00%'})
+        }
+    
     def _create_summary_sheet(self, writer):
         """Create summary sheet with key metrics and charts"""
         summary_sheet = self.workbook.add_worksheet('Summary')
         writer.sheets['Summary'] = summary_sheet
         
         # Formats
-        title_format = self.workbook.add_format({
-            'bold': True, 
-            'font_size': 18,
-            'font_color': '#1f4788',
-            'align': 'center'
-        })
-        
-        header_format = self.workbook.add_format({
-            'bold': True,
-            'font_size': 14,
-            'font_color': '#1f4788',
-            'bottom': 2
-        })
-        
-        metric_label_format = self.workbook.add_format({
-            'bold': True,
-            'font_size': 11,
-            'bg_color': '#E8F0FE'
-        })
-        
-        metric_value_format = self.workbook.add_format({
-            'font_size': 11,
-            'num_format': '#,##0'
-        })
-        
-        percentage_format = self.workbook.add_format({
-            'font_size': 11,
-            'num_format': '0.0%'
-        })
+        title_format = self._fmt['title']
+        header_format = self._fmt['header']
+        metric_label_format = self._fmt['label']
+        metric_value_format = self._fmt['value']
+        percentage_format = self._fmt['pct']
         
         # Title
         summary_sheet.merge_range('A1:H1', 
@@ -79,10 +165,10 @@ class ExcelExporter:
         summary_sheet.write('A3', 'Key Performance Indicators', header_format)
         
         # Calculate metrics
-        total_customers = len(self.filtered_data)
-        inet_eligible = len(self.filtered_data[self.filtered_data['INET_ELIGIBLE'] == 'Y'])
-        registered = len(self.filtered_data[self.filtered_data['iNET_Registration_status'] == 'Registered'])
-        active_users = len(self.filtered_data[self.filtered_data['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active'])])
+        total_customers = self._counts['total']
+        inet_eligible = self._counts['eligible']
+        registered = self._counts['registered']
+        active_users = self._counts['active_30']
         
         adoption_rate = registered / inet_eligible if inet_eligible > 0 else 0
         active_rate = active_users / registered if registered > 0 else 0
@@ -112,15 +198,13 @@ class ExcelExporter:
         # Regional Summary
         summary_sheet.write('A9', 'Regional Performance Summary', header_format)
         
-        regional_summary = self.filtered_data.groupby('REGION_DESC').agg({
-            'CUSTOMER_NO': 'count',
-            'INET_ELIGIBLE': lambda x: (x == 'Y').sum(),
-            'iNET_Registration_status': lambda x: (x == 'Registered').sum()
-        }).rename(columns={
-            'CUSTOMER_NO': 'Total',
-            'INET_ELIGIBLE': 'Eligible',
-            'iNET_Registration_status': 'Registered'
-        })
+        # Per-region counts from the single pass in __init__
+        regional_summary = pd.DataFrame(
+            self._region_counts,
+            index=pd.Index(self._region_categories, name='REGION_DESC'),
+            columns=['Total', 'Eligible', 'Registered']
+        )
+        regional_summary = regional_summary[regional_summary['Total'] > 0]
         
         regional_summary['Adoption_Rate'] = regional_summary['Registered'] / regional_summary['Eligible']
         regional_summary = regional_summary.sort_values('Adoption_Rate', ascending=False)
@@ -131,14 +215,12 @@ class ExcelExporter:
         for col, header in enumerate(col_headers):
             summary_sheet.write(row, col, header, metric_label_format)
         
-        row += 1
-        for region, data in regional_summary.iterrows():
-            summary_sheet.write(row, 0, region)
-            summary_sheet.write(row, 1, data['Total'], metric_value_format)
-            summary_sheet.write(row, 2, data['Eligible'], metric_value_format)
-            summary_sheet.write(row, 3, data['Registered'], metric_value_format)
-            summary_sheet.write(row, 4, data['Adoption_Rate'], percentage_format)
-            row += 1
+        # One write_row for the three counts per region instead of a write per cell
+        regional_rows = regional_summary.itertuples(name=None)
+        for row_num, (region, total, eligible, registered, adoption_rate) in enumerate(regional_rows, start=row + 1):
+            summary_sheet.write_string(row_num, 0, region)
+            summary_sheet.write_row(row_num, 1, [total, eligible, registered], metric_value_format)
+            summary_sheet.write_number(row_num, 4, adoption_rate, percentage_format)
         
         # Adjust column widths
         summary_sheet.set_column('A:A', 20)
@@ -146,48 +228,36 @@ class ExcelExporter:
         
     def _create_data_sheets(self, writer):
         """Create sheets with raw and processed data"""
-        # Filtered customer data
-        self.filtered_data.to_excel(writer, sheet_name='Customer_Data', index=False)
-        
-        # Format the data sheet
-        data_sheet = writer.sheets['Customer_Data']
-        header_format = self.workbook.add_format({
-            'bold': True,
-            'bg_color': '#1f4788',
-            'font_color': 'white',
-            'align': 'center'
-        })
-        
-        # Apply header format
-        for col_num, value in enumerate(self.filtered_data.columns.values):
-            data_sheet.write(0, col_num, value, header_format)
+        # Filtered customer data, written straight through xlsxwriter
+        data_sheet = self.workbook.add_worksheet('Customer_Data')
+        writer.sheets['Customer_Data'] = data_sheet
+        write_dataframe_rows(data_sheet, self.filtered_data, self._fmt['data_header'])
     
     def _create_analysis_sheets(self, writer):
         """Create detailed analysis sheets"""
         
         # 1. Onboarding Analysis
-        onboarding_data = self.filtered_data[
-            self.filtered_data['iNET_Registration_status'] == 'Registered'
-        ].copy()
+        # Only the columns read below; nothing is modified, so no copy is needed
+        onboarding_data = self.filtered_data.loc[
+            self._reg_mask, ['REGION_DESC', 'days_to_onboard', 'onboarding_time_category']
+        ]
         
         if not onboarding_data.empty:
             # Regional onboarding stats
-            regional_onboarding = onboarding_data.groupby('REGION_DESC')['days_to_onboard'].agg([
-                'count', 'mean', 'median', 'std', 'min', 'max'
-            ]).round(2)
-            regional_onboarding.columns = ['Count', 'Mean_Days', 'Median_Days', 'Std_Dev', 'Min_Days', 'Max_Days']
+            regional_onboarding = onboarding_data.groupby('REGION_DESC', observed=True)['days_to_onboard'].agg(
+                Count='count', Mean_Days='mean', Median_Days='median',
+                Std_Dev='std', Min_Days='min', Max_Days='max'
+            )
             regional_onboarding.to_excel(writer, sheet_name='Onboarding_Analysis')
+            # Day statistics (Mean_Days..Max_Days) shown to two decimals by Excel
+            writer.sheets['Onboarding_Analysis'].set_column('C:G', 12, self._fmt['num2'])
             
             # Onboarding time distribution
             time_dist = onboarding_data['onboarding_time_category'].value_counts()
             time_dist.to_excel(writer, sheet_name='Onboarding_Analysis', startrow=len(regional_onboarding) + 3)
         
         # 2. Activity Analysis
-        activity_summary = pd.crosstab(
-            self.filtered_data['REGION_DESC'],
-            self.filtered_data['Activity_Status'],
-            margins=True
-        )
+        activity_summary = self._count_region_by_activity()
         activity_summary.to_excel(writer, sheet_name='Activity_Analysis')
         
         # 3. Funnel Analysis
@@ -201,34 +271,67 @@ class ExcelExporter:
             years = sorted(self.all_data['AC_OPEN_YEAR'].dropna().unique())
             if len(years) >= 2:
                 comparison_years = years[-2:]
+                # Two vectorised equality checks on the raw values instead of isin's
+                # hash-table lookup (missing years compare False either way)
+                open_years = self.all_data['AC_OPEN_YEAR'].to_numpy()
                 comparison_data = self.all_data[
-                    self.all_data['AC_OPEN_YEAR'].isin(comparison_years)
+                    (open_years == comparison_years[0]) | (open_years == comparison_years[1])
                 ]
                 
-                # Monthly comparison
-                monthly_comp = comparison_data.groupby(['AC_OPEN_YEAR', 'AC_OPEN_MONTH']).agg({
-                    'CUSTOMER_NO': 'count',
-                    'iNET_Registration_status': lambda x: (x == 'Registered').sum()
-                }).rename(columns={
-                    'CUSTOMER_NO': 'Total_Accounts',
-                    'iNET_Registration_status': 'Registered'
-                })
+                # Monthly comparison, counting registrations from an indicator column
+                # so both aggregations stay in the Cython groupby path
+                monthly_comp = comparison_data[['AC_OPEN_YEAR', 'AC_OPEN_MONTH', 'CUSTOMER_NO']].assign(
+                    _is_reg=(comparison_data['iNET_Registration_status'] == 'Registered').astype(np.int64)
+                ).groupby(['AC_OPEN_YEAR', 'AC_OPEN_MONTH']).agg(
+                    Total_Accounts=('CUSTOMER_NO', 'count'),
+                    Registered=('_is_reg', 'sum')
+                )
                 
                 monthly_comp['Registration_Rate'] = (
                     monthly_comp['Registered'] / monthly_comp['Total_Accounts']
-                ).round(4)
+                )
                 
                 # Pivot for easier comparison
                 monthly_pivot = monthly_comp.unstack(level=0)
                 monthly_pivot.to_excel(writer, sheet_name='YoY_Comparison')
+                
+                # Rate columns (after the month index column) shown as percentages
+                rate_cols = [i + 1 for i, (metric, _) in enumerate(monthly_pivot.columns)
+                             if metric == 'Registration_Rate']
+                writer.sheets['YoY_Comparison'].set_column(rate_cols[0], rate_cols[-1], 12, self._fmt['pct2'])
+    
+    def _count_region_by_activity(self):
+        """Region x activity status counts with 'All' margins, like pd.crosstab(margins=True)"""
+        activity = self.filtered_data['Activity_Status']
+        activity_codes = activity.cat.codes.to_numpy()
+        activity_categories = activity.cat.categories
+        
+        # One bincount over the combined (region, activity) code of every row
+        # with both values present, reshaped into the contingency table
+        n_regions = len(self._region_categories)
+        n_activities = len(activity_categories)
+        both = (self._region_codes >= 0) & (activity_codes >= 0)
+        cell_codes = self._region_codes[both].astype(np.int64) * n_activities + activity_codes[both]
+        counts = np.bincount(cell_codes, minlength=n_regions * n_activities).reshape(n_regions, n_activities)
+        
+        table = pd.DataFrame(
+            counts,
+            index=pd.Index(self._region_categories, name='REGION_DESC'),
+            columns=pd.Index(activity_categories, name='Activity_Status')
+        )
+        # Only regions and statuses that actually occur, then the margins
+        table = table.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+        table['All'] = table.sum(axis=1)
+        table.loc['All'] = table.sum(axis=0)
+        return table
     
     def _create_funnel_data(self):
         """Create funnel analysis data"""
-        total = len(self.filtered_data)
-        eligible = len(self.filtered_data[self.filtered_data['INET_ELIGIBLE'] == 'Y'])
-        registered = len(self.filtered_data[self.filtered_data['iNET_Registration_status'] == 'Registered'])
-        active_30 = len(self.filtered_data[self.filtered_data['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active'])])
-        weekly_active = len(self.filtered_data[self.filtered_data['Activity_Status'] == 'Weekly Active'])
+        total = self._counts['total']
+        eligible = self._counts['eligible']
+        registered = self._counts['registered']
+        active_30 = self._counts['active_30']
+        weekly_active = self._counts['weekly_active']
         
         funnel_df = pd.DataFrame({
             'Stage': ['Total Customers', 'iNET Eligible', 'Registered', 'Active (30 days)', 'Weekly Active'],
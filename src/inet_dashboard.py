@@ -9,9 +9,22 @@ warnings.filterwarnings('ignore')
 from io import BytesIO
 import xlsxwriter
 from datetime import datetime
-import base64
 import os
 import gc
+import hashlib
+
+# Columns the dashboard reads; CSV loads parse only these
+USECOLS = ['UNIQUE_ID_VALUE', 'CUSTOMER_NO', 'BRANCH_CODE', 'BRANCH_NAME', 'REGION_DESC', 'AC_OPEN_DATE',
+           'INET_ELIGIBLE', 'AGE', 'ACCOUNT_TYPE', 'ACCOUNT_STATUS', 'CURRENCY',
+           'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'MOBILE_APP_REGISTRATION_DATE', 'LAST_TRX_DATE',
+           'CIF_CREATION_DATE']
+
+def csv_usecols(source):
+    """USECOLS entries present in the CSV header, or None to read every column"""
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return [col for col in USECOLS if col in header] or None
 
 # Page configuration
 st.set_page_config(
@@ -32,6 +45,9 @@ data_option = st.sidebar.radio(
 )
 
 df = None
+# Cheap identifier of the loaded data (source + version), used as the
+# preprocessing cache key so Streamlit never hashes the frame itself
+data_key = None
 
 if data_option == "Upload File (< 200MB)":
     uploaded_file = st.file_uploader(
@@ -41,17 +57,34 @@ if data_option == "Upload File (< 200MB)":
     )
     
     if uploaded_file is not None:
-        @st.cache_data
-        def load_uploaded_file(file):
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith('.xlsx'):
-                df = pd.read_excel(file, engine='openpyxl')
-            elif file.name.endswith('.xlsb'):
-                df = pd.read_excel(file, engine='pyxlsb')
+        # Keyed on the content, so a corrected file with the same name and
+        # size is processed afresh. The digest is computed once per upload
+        # (file_id changes with every upload) and kept in the session, so
+        # reruns from widget clicks don't rehash the file
+        if st.session_state.get('upload_file_id') != uploaded_file.file_id:
+            st.session_state.upload_file_id = uploaded_file.file_id
+            st.session_state.upload_digest = hashlib.md5(uploaded_file.getvalue()).hexdigest()
+        data_key = f"upload:{st.session_state.upload_digest}"
+        
+        # The leading underscore keeps Streamlit from hashing the upload; the
+        # result is cached on data_key
+        @st.cache_data(max_entries=2)
+        def load_uploaded_file(_file, data_key):
+            if _file.name.endswith('.csv'):
+                # pyarrow parses the CSV on multiple threads; the low-cardinality
+                # text columns are decoded straight to categoricals instead of
+                # being inferred as strings (columns absent from the file are ignored)
+                category_columns = ['REGION_DESC', 'BRANCH_NAME', 'INET_ELIGIBLE',
+                                    'ACCOUNT_TYPE', 'ACCOUNT_STATUS', 'CURRENCY']
+                df = pd.read_csv(_file, engine='pyarrow', usecols=csv_usecols(_file),
+                                 dtype={col: 'category' for col in category_columns})
+            elif _file.name.endswith('.xlsx'):
+                df = pd.read_excel(_file, engine='openpyxl')
+            elif _file.name.endswith('.xlsb'):
+                df = pd.read_excel(_file, engine='pyxlsb')
             return df
         
-        df = load_uploaded_file(uploaded_file)
+        df = load_uploaded_file(uploaded_file, data_key)
 
 elif data_option == "Load from Local Path":
     st.info("📌 For large files (> 200MB), specify the file path on your local machine")
@@ -68,27 +101,44 @@ elif data_option == "Load from Local Path":
                     # For very large files, use chunking
                     @st.cache_data
                     def load_large_csv(path, sample_size=None):
-                        # First, get the total number of rows
-                        total_rows = sum(1 for line in open(path, 'r', encoding='utf-8')) - 1
-                        st.info(f"Total rows in file: {total_rows:,}")
+                        # Full loads are cached as Parquet next to the CSV and reused
+                        # for as long as the cache is newer than the CSV
+                        parquet_cache = path + '.parquet'
+                        if (not sample_size and os.path.exists(parquet_cache)
+                                and os.path.getmtime(parquet_cache) >= os.path.getmtime(path)):
+                            df = pd.read_parquet(parquet_cache, engine='pyarrow')
+                            st.success(f"Loaded {len(df):,} rows from Parquet cache")
+                            return df
+                        
+                        # Sampling needs the row count; estimate it from the file size and
+                        # the average line length of the first 1MB instead of reading
+                        # the whole file just to count lines
+                        if sample_size:
+                            with open(path, 'rb') as f:
+                                head = f.read(1 << 20)
+                            avg_line_length = len(head) / max(head.count(b'\n'), 1)
+                            total_rows = max(int(os.path.getsize(path) / avg_line_length) - 1, 0)
+                            st.info(f"Estimated rows in file: {total_rows:,}")
                         
                         if sample_size and total_rows > sample_size:
-                            # Sample random rows for faster processing
-                            skip_rows = sorted(np.random.choice(range(1, total_rows), 
-                                                              total_rows - sample_size, 
-                                                              replace=False))
-                            df = pd.read_csv(path, skiprows=skip_rows)
-                            st.warning(f"Loaded {sample_size:,} random samples from {total_rows:,} total rows")
+                            # Sample random rows for faster processing: keep each data row
+                            # with probability sample_size / total_rows as it is parsed, so
+                            # no skip list is built (the sample size is approximate)
+                            keep_fraction = sample_size / total_rows
+                            rng = np.random.default_rng(42)
+                            df = pd.read_csv(path, usecols=csv_usecols(path),
+                                             skiprows=lambda i: i > 0 and rng.random() > keep_fraction)
+                            st.warning(f"Loaded {len(df):,} random samples from ~{total_rows:,} total rows")
                         else:
-                            # Load full file in chunks for memory efficiency
-                            chunks = []
-                            chunk_size = 50000
-                            
-                            for chunk in pd.read_csv(path, chunksize=chunk_size):
-                                chunks.append(chunk)
-                                
-                            df = pd.concat(chunks, ignore_index=True)
+                            # Load the full file in one multi-threaded pyarrow parse
+                            # (its columnar buffers replace the chunk-and-concat copy)
+                            df = pd.read_csv(path, engine='pyarrow', usecols=csv_usecols(path))
                             st.success(f"Successfully loaded {len(df):,} rows")
+                            
+                            try:
+                                df.to_parquet(parquet_cache, engine='pyarrow', compression='snappy', index=False)
+                            except OSError as e:
+                                st.warning(f"Could not write Parquet cache: {str(e)}")
                         
                         return df
                     
@@ -103,6 +153,7 @@ elif data_option == "Load from Local Path":
                         df = load_large_csv(file_path, sample_size)
                     else:
                         df = load_large_csv(file_path)
+                    data_key = f"{file_path}:{os.path.getmtime(file_path)}:{sample_size if use_sample else 'full'}"
                     
                     # Free up memory
                     gc.collect()
@@ -128,8 +179,9 @@ elif data_option == "Use Sample Data":
         start_date = pd.Timestamp('2023-01-01')
         end_date = pd.Timestamp('2025-05-23')
         
-        df = pd.DataFrame({
-            'UNIQUE_ID_VALUE': range(1, n_rows + 1),
+        # Every column is prepared as an array first and the frame is built once
+        data = {
+            'UNIQUE_ID_VALUE': np.arange(1, n_rows + 1),
             'UNIQUE_ID_NAME': [f'ID_{i}' for i in range(1, n_rows + 1)],
             'CUSTOMER_NO': np.random.randint(100000, 999999, n_rows),
             'BRANCH_CODE': np.random.randint(1, 101, n_rows),
@@ -137,50 +189,52 @@ elif data_option == "Use Sample Data":
             'REGION_DESC': np.random.choice(regions, n_rows),
             'AC_OPEN_DATE': pd.to_datetime(
                 np.random.randint(start_date.value, end_date.value, n_rows)
-            ),
+            ).to_numpy(),
             'INET_ELIGIBLE': np.random.choice(['Y', 'N'], n_rows, p=[0.8, 0.2]),
             'AGE': np.random.randint(18, 70, n_rows),
             'ACCOUNT_TYPE': np.random.choice(['Savings', 'Current', 'Fixed'], n_rows, p=[0.7, 0.2, 0.1]),
             'ACCOUNT_STATUS': np.random.choice(['Active', 'Inactive'], n_rows, p=[0.9, 0.1]),
-            'CURRENCY': 'PKR',
+            'CURRENCY': np.full(n_rows, 'PKR'),
             'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE': np.random.uniform(1000, 100000, n_rows)
-        })
+        }
+        
+        ac_open_date = data['AC_OPEN_DATE']
         
         # Add mobile app registration dates (70% registered)
         registered_mask = np.random.choice([True, False], n_rows, p=[0.7, 0.3])
-        df['MOBILE_APP_REGISTRATION_DATE'] = pd.NaT
+        n_registered = int(registered_mask.sum())
         
-        for idx in df[registered_mask].index:
-            ac_open = df.loc[idx, 'AC_OPEN_DATE']
-            # Some registered before account opening (10%), others after
-            if np.random.random() < 0.1:
-                days_before = np.random.randint(1, 365)
-                df.loc[idx, 'MOBILE_APP_REGISTRATION_DATE'] = ac_open - pd.Timedelta(days=days_before)
-            else:
-                days_after = np.random.exponential(30)  # Most register within 30 days
-                df.loc[idx, 'MOBILE_APP_REGISTRATION_DATE'] = ac_open + pd.Timedelta(days=int(days_after))
+        # Some registered before account opening (10%), others after
+        registered_before = np.random.random(n_registered) < 0.1
+        days_before = np.random.randint(1, 365, n_registered)
+        days_after = np.random.exponential(30, n_registered).astype(int)  # Most register within 30 days
+        registration_offsets = np.where(registered_before, -days_before, days_after).astype('timedelta64[D]')
+        registration_date = np.full(n_rows, np.datetime64('NaT'), dtype='datetime64[ns]')
+        registration_date[registered_mask] = ac_open_date[registered_mask] + registration_offsets
+        data['MOBILE_APP_REGISTRATION_DATE'] = registration_date
         
         # Add last transaction dates
-        df['LAST_TRX_DATE'] = pd.NaT
-        for idx in df[registered_mask].index:
-            reg_date = df.loc[idx, 'MOBILE_APP_REGISTRATION_DATE']
-            if pd.notna(reg_date):
-                days_since = np.random.exponential(15)  # Recent transactions
-                df.loc[idx, 'LAST_TRX_DATE'] = end_date - pd.Timedelta(days=int(days_since))
+        days_since = np.random.exponential(15, n_registered).astype(int)  # Recent transactions
+        last_trx_date = np.full(n_rows, np.datetime64('NaT'), dtype='datetime64[ns]')
+        last_trx_date[registered_mask] = end_date.to_datetime64() - days_since.astype('timedelta64[D]')
+        data['LAST_TRX_DATE'] = last_trx_date
         
         # Add other required columns
-        df['CIF_CREATION_DATE'] = df['AC_OPEN_DATE'] - pd.Timedelta(days=np.random.randint(0, 30, n_rows))
-        df['CUSTOMER_RELATIONSHIP_DATE'] = df['CIF_CREATION_DATE']
-        df['AREA'] = df['REGION_DESC'] + '_Area'
-        df['ACCOUNT_CLASS'] = 'Standard'
-        df['ACCOUNT_CLASS_DESCRIPTION'] = 'Standard Account'
-        df['ELIGIBLE'] = df['INET_ELIGIBLE']
-        df['ELIGIBLE_REMARKS'] = 'Eligible for iNET'
-        df['INET_ELIGIBLE'] = df['ELIGIBLE']
+        cif_creation_date = ac_open_date - np.random.randint(0, 30, n_rows).astype('timedelta64[D]')
+        data['CIF_CREATION_DATE'] = cif_creation_date
+        data['CUSTOMER_RELATIONSHIP_DATE'] = cif_creation_date
+        data['AREA'] = np.char.add(data['REGION_DESC'], '_Area')
+        data['ACCOUNT_CLASS'] = np.full(n_rows, 'Standard')
+        data['ACCOUNT_CLASS_DESCRIPTION'] = np.full(n_rows, 'Standard Account')
+        data['ELIGIBLE'] = data['INET_ELIGIBLE']
+        data['ELIGIBLE_REMARKS'] = np.full(n_rows, 'Eligible for iNET')
+        
+        df = pd.DataFrame(data)
         
         return df
     
     df = create_sample_data()
+    data_key = "sample"
     st.success("Sample data loaded successfully!")
 
 elif data_option == "Process Large File Locally":
@@ -232,72 +286,76 @@ elif data_option == "Process Large File Locally":
 
 # Continue with the rest of the dashboard only if data is loaded
 if df is not None:
+    # Narrow dtypes of the processed frame: repeated text as category codes,
+    # integer ids/ages at the smallest width that fits. Balances stay float64
+    # so totals and averages keep their cents
+    def _shrink_dtypes(df_processed):
+        category_columns = ['REGION_DESC', 'BRANCH_NAME', 'ACCOUNT_TYPE', 'ACCOUNT_STATUS',
+                            'CURRENCY', 'INET_ELIGIBLE', 'Activity_Status']
+        integer_columns = ['CUSTOMER_NO', 'BRANCH_CODE', 'AGE']
+        
+        for col in category_columns:
+            if col in df_processed.columns:
+                df_processed[col] = df_processed[col].astype('category')
+        for col in integer_columns:
+            if col in df_processed.columns and pd.api.types.is_integer_dtype(df_processed[col]):
+                df_processed[col] = pd.to_numeric(df_processed[col], downcast='unsigned')
+        
+        return df_processed
+    
     # Data preprocessing function
-    @st.cache_data
-    def preprocess_data(df):
-        df_processed = df.copy()
+    # The leading underscore keeps Streamlit from hashing the frame; the
+    # result is cached on cache_key and the reference date, keeping only the
+    # latest couple so a long-running app doesn't hold one frame per day
+    @st.cache_data(max_entries=2)
+    def preprocess_data(_df, cache_key, today=None):
+        if today is None:
+            today = pd.Timestamp.today().normalize()
+        # Shallow copy: every step below assigns whole columns, so the input's
+        # data is shared rather than duplicated and the input is never modified
+        df_processed = _df.copy(deep=False)
         
         # Convert date columns
         date_columns = ['CIF_CREATION_DATE', 'CUSTOMER_RELATIONSHIP_DATE', 'AC_OPEN_DATE', 
                        'MOBILE_APP_REGISTRATION_DATE', 'LAST_TRX_DATE']
         
+        # Columns that are already datetime64 (sample data, Parquet cache, pyarrow
+        # timestamps) are left as they are; text is parsed with the single format
+        # pandas infers from the first value, keeping errors='coerce' for bad rows
         for col in date_columns:
-            if col in df_processed.columns:
+            if col in df_processed.columns and not pd.api.types.is_datetime64_any_dtype(df_processed[col]):
                 df_processed[col] = pd.to_datetime(df_processed[col], errors='coerce')
         
-        # Create registration status
-        def get_registration_status(row):
-            if pd.isna(row['MOBILE_APP_REGISTRATION_DATE']):
-                return 'Not Registered'
-            elif row['MOBILE_APP_REGISTRATION_DATE'] < row['AC_OPEN_DATE']:
-                return 'Already Registered'
-            else:
-                return 'Registered'
-        
-        df_processed['iNET_Registration_status'] = df_processed.apply(get_registration_status, axis=1)
+        # Create registration status (vectorised over both date columns;
+        # comparisons against a missing date are False, as in a row-wise check)
+        registration_date = df_processed['MOBILE_APP_REGISTRATION_DATE']
+        not_registered = registration_date.isna().to_numpy()
+        already_registered = (~not_registered) & (registration_date < df_processed['AC_OPEN_DATE']).to_numpy()
+        df_processed['iNET_Registration_status'] = pd.Categorical(
+            np.select([not_registered, already_registered], ['Not Registered', 'Already Registered'], default='Registered'),
+            categories=['Registered', 'Already Registered', 'Not Registered']
+        )
         
         # Calculate days to onboard
         df_processed['days_to_onboard'] = (df_processed['MOBILE_APP_REGISTRATION_DATE'] - df_processed['AC_OPEN_DATE']).dt.days
         
-        # Onboarding time categories
-        def categorize_onboarding_time(row):
-            if row['iNET_Registration_status'] in ['Already Registered', 'Not Registered']:
-                return None
-            days = row['days_to_onboard']
-            if pd.isna(days):
-                return None
-            elif days <= 7:
-                return 'Within 1 week'
-            elif days <= 15:
-                return 'Within 15 days'
-            elif days <= 30:
-                return '15-30 days'
-            elif days <= 60:
-                return 'Within 2 months'
-            elif days <= 90:
-                return 'Within 3 months'
-            elif days <= 180:
-                return 'Within 6 months'
-            else:
-                return 'More than 6 months'
-        
-        df_processed['onboarding_time_category'] = df_processed.apply(categorize_onboarding_time, axis=1)
+        # Onboarding time categories, bucketed in one pass; only customers who
+        # registered after opening their account get a category
+        onboarding_bins = [-np.inf, 7, 15, 30, 60, 90, 180, np.inf]
+        onboarding_labels = ['Within 1 week', 'Within 15 days', '15-30 days', 'Within 2 months',
+                             'Within 3 months', 'Within 6 months', 'More than 6 months']
+        onboarding_time = pd.cut(df_processed['days_to_onboard'], bins=onboarding_bins, labels=onboarding_labels)
+        df_processed['onboarding_time_category'] = onboarding_time.where(
+            df_processed['iNET_Registration_status'] == 'Registered'
+        )
         
         # Calculate days since last transaction
-        current_date = pd.Timestamp.now()
-        df_processed['days_since_last_trx'] = (current_date - df_processed['LAST_TRX_DATE']).dt.days
-        
-        # Create activity status
-        conditions = [
-            (df_processed['days_since_last_trx'] <= 7),
-            (df_processed['days_since_last_trx'] <= 14),
-            (df_processed['days_since_last_trx'] <= 30),
-            (df_processed['days_since_last_trx'] <= 90),
-            (df_processed['days_since_last_trx'] <= 180),
-            (df_processed['days_since_last_trx'] <= 365),
-            (df_processed['days_since_last_trx'] > 365)
-        ]
+        df_processed['days_since_last_trx'] = (today - df_processed['LAST_TRX_DATE']).dt.days
         
+        # Create activity status: one searchsorted over the day thresholds gives
+        # each row its bucket (right edges inclusive, as <= 7, <= 14, ...), and
+        # rows with no transaction date fall into 'Unknown'
+        activity_edges = np.array([7, 14, 30, 90, 180, 365])
         choices = [
             'Weekly Active',
             'Biweekly Active', 
@@ -305,20 +363,43 @@ if df is not None:
             '3 Months Active',
             '6 Months Active',
             '1 Year Active',
-            'More than 1 Year'
+            'More than 1 Year',
+            'Unknown'
         ]
         
-        df_processed['Activity_Status'] = np.select(conditions, choices, default='Unknown')
+        days_since_last_trx = df_processed['days_since_last_trx'].to_numpy(dtype=float)
+        activity_codes = np.where(
+            np.isnan(days_since_last_trx),
+            len(choices) - 1,
+            np.searchsorted(activity_edges, days_since_last_trx, side='left')
+        )
+        df_processed['Activity_Status'] = pd.Categorical.from_codes(activity_codes, categories=choices)
         
-        # Add year and month columns
-        df_processed['AC_OPEN_YEAR'] = df_processed['AC_OPEN_DATE'].dt.year
-        df_processed['AC_OPEN_MONTH'] = df_processed['AC_OPEN_DATE'].dt.month
+        # Add year and month columns from months-since-epoch integer arithmetic;
+        # rows with no opening date get NaN, as .dt.year/.dt.month would give.
+        # The cast goes from the column's own unit, so sentinels like 9999-12-31
+        # don't wrap around the nanosecond range
+        open_date = df_processed['AC_OPEN_DATE'].to_numpy()
+        months_since_epoch = open_date.astype('datetime64[M]').astype(np.int64)
+        open_year = (months_since_epoch // 12 + 1970).astype(np.int16)
+        open_month = (months_since_epoch % 12 + 1).astype(np.int8)
+        missing_open_date = np.isnat(open_date)
+        if missing_open_date.any():
+            df_processed['AC_OPEN_YEAR'] = np.where(missing_open_date, np.nan, open_year)
+            df_processed['AC_OPEN_MONTH'] = np.where(missing_open_date, np.nan, open_month)
+        else:
+            df_processed['AC_OPEN_YEAR'] = open_year
+            df_processed['AC_OPEN_MONTH'] = open_month
         
-        return df_processed
+        return _shrink_dtypes(df_processed)
     
     # Process data
     with st.spinner("Processing data..."):
-        df_processed = preprocess_data(df)
+        # Activity is measured against today's date, so the cached result is
+        # reused for the rest of the day and recomputed on the next one
+        today = pd.Timestamp.today().normalize()
+        processed_key = f"{data_key}:{len(df)}"
+        df_processed = preprocess_data(df, processed_key, today=today)
     
     # Show data info
     st.success(f"Data loaded successfully! Total rows: {len(df_processed):,}")
@@ -344,12 +425,25 @@ if df is not None:
     regions = ['All'] + sorted(df_processed['REGION_DESC'].dropna().unique().tolist())
     selected_region = st.sidebar.selectbox("Select Region", regions)
     
-    # Apply filters
-    filtered_df = df_processed.copy()
+    # Row positions of every year and region, grouped once per data set and
+    # shared across reruns, so applying a filter is a take rather than a
+    # fresh mask over the whole column
+    @st.cache_resource(show_spinner=False, max_entries=4)
+    def filter_rows(_df, cache_key, today):
+        year_rows = _df.groupby('AC_OPEN_YEAR', observed=True).indices
+        region_rows = _df.groupby('REGION_DESC', observed=True).indices
+        return year_rows, region_rows
+    
+    # Apply filters; filtered_df is only read below, so the unfiltered view
+    # is the processed frame itself
+    year_rows, region_rows = filter_rows(df_processed, processed_key, today)
+    rows = None
     if selected_year != 'All':
-        filtered_df = filtered_df[filtered_df['AC_OPEN_YEAR'] == selected_year]
+        rows = year_rows.get(selected_year, np.array([], dtype=np.intp))
     if selected_region != 'All':
-        filtered_df = filtered_df[filtered_df['REGION_DESC'] == selected_region]
+        region_selection = region_rows.get(selected_region, np.array([], dtype=np.intp))
+        rows = region_selection if rows is None else np.intersect1d(rows, region_selection, assume_unique=True)
+    filtered_df = df_processed if rows is None else df_processed.take(rows)
     
     # Store all figures for Excel export
     figures = {}
@@ -365,11 +459,11 @@ if df is not None:
         st.metric("Total Customers", f"{total_customers:,}")
     
     with col2:
-        inet_eligible = len(filtered_df[filtered_df['INET_ELIGIBLE'] == 'Y'])
+        inet_eligible = int((filtered_df['INET_ELIGIBLE'] == 'Y').sum())
         st.metric("iNET Eligible", f"{inet_eligible:,}")
     
     with col3:
-        registered_customers = len(filtered_df[filtered_df['iNET_Registration_status'] == 'Registered'])
+        registered_customers = int((filtered_df['iNET_Registration_status'] == 'Registered').sum())
         if inet_eligible > 0:
             adoption_rate = (registered_customers / inet_eligible) * 100
             st.metric("Adoption Rate", f"{adoption_rate:.1f}%")
@@ -377,7 +471,7 @@ if df is not None:
             st.metric("Adoption Rate", "0%")
     
     with col4:
-        active_users = len(filtered_df[filtered_df['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active'])])
+        active_users = int(filtered_df['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active']).sum())
         if registered_customers > 0:
             active_rate = (active_users / registered_customers) * 100
             st.metric("Active User Rate", f"{active_rate:.1f}%")
@@ -400,26 +494,24 @@ if df is not None:
             })
             
             csv = summary_stats.to_csv(index=False)
-            b64 = base64.b64encode(csv.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="summary_stats.csv">Download Summary CSV</a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.download_button("Download Summary CSV", data=csv,
+                               file_name="summary_stats.csv", mime="text/csv")
     
     with col2:
         if st.button("Export Regional Analysis"):
-            regional_stats = filtered_df.groupby('REGION_DESC').agg({
-                'CUSTOMER_NO': 'count',
-                'INET_ELIGIBLE': lambda x: (x == 'Y').sum(),
-                'iNET_Registration_status': lambda x: (x == 'Registered').sum()
-            }).rename(columns={
-                'CUSTOMER_NO': 'Total_Customers',
-                'INET_ELIGIBLE': 'Eligible_Customers',
-                'iNET_Registration_status': 'Registered_Customers'
-            })
+            # Indicator columns let all three counts run as one Cython groupby
+            regional_stats = filtered_df[['REGION_DESC', 'CUSTOMER_NO']].assign(
+                _elig=(filtered_df['INET_ELIGIBLE'] == 'Y').astype('int32'),
+                _reg=(filtered_df['iNET_Registration_status'] == 'Registered').astype('int32')
+            ).groupby('REGION_DESC', observed=True).agg(
+                Total_Customers=('CUSTOMER_NO', 'count'),
+                Eligible_Customers=('_elig', 'sum'),
+                Registered_Customers=('_reg', 'sum')
+            )
             
             csv = regional_stats.to_csv()
-            b64 = base64.b64encode(csv.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="regional_analysis.csv">Download Regional CSV</a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.download_button("Download Regional CSV", data=csv,
+                               file_name="regional_analysis.csv", mime="text/csv")
     
     with col3:
         if st.button("Export Filtered Data Sample"):
@@ -428,9 +520,8 @@ if df is not None:
             sample_data = filtered_df.head(sample_size)
             
             csv = sample_data.to_csv(index=False)
-            b64 = base64.b64encode(csv.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="filtered_data_sample.csv">Download Sample CSV ({sample_size} rows)</a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.download_button(f"Download Sample CSV ({sample_size} rows)", data=csv,
+                               file_name="filtered_data_sample.csv", mime="text/csv")
 
 else:
     if data_option != "Process Large File Locally":
@@ -7,9 +7,28 @@ from plotly.subplots import make_subplots
 import warnings
 warnings.filterwarnings('ignore')
 from io import BytesIO
+import os
+import hashlib
+import tempfile
 import xlsxwriter
+from pandas.tseries.api import guess_datetime_format
 from datetime import datetime
-import base64
+from excel_export_utility import write_dataframe_rows
+
+# Columns kept after preprocessing: the customer fields the dashboard and its
+# Customer_Data export use, plus the columns derived in preprocess_data
+USED_COLS = ['UNIQUE_ID_VALUE', 'CUSTOMER_NO', 'BRANCH_CODE', 'BRANCH_NAME', 'REGION_DESC', 'INET_ELIGIBLE',
+             'AGE', 'ACCOUNT_TYPE', 'ACCOUNT_STATUS', 'CURRENCY', 'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE',
+             'CIF_CREATION_DATE', 'CUSTOMER_RELATIONSHIP_DATE', 'AC_OPEN_DATE', 'MOBILE_APP_REGISTRATION_DATE',
+             'LAST_TRX_DATE', 'iNET_Registration_status', 'days_to_onboard', 'onboarding_time_category',
+             'days_since_last_trx', 'Activity_Status', 'AC_OPEN_YEAR', 'AC_OPEN_MONTH']
+
+def _whole_days(later, earlier):
+    """Whole days from earlier to later as Int32, floored like .dt.days; <NA> where either is NaT"""
+    delta = later - earlier
+    ticks_per_day = np.timedelta64(1, 'D') // np.timedelta64(1, np.datetime_data(delta.dtype)[0])
+    days = (delta.view('i8') // ticks_per_day).astype(np.int32)
+    return pd.arrays.IntegerArray(days, np.isnat(delta))
 
 # Page configuration
 st.set_page_config(
@@ -31,14 +50,15 @@ uploaded_file = st.file_uploader(
 
 if uploaded_file is not None:
     # Load data based on file type
-    @st.cache_data
     def load_data(file):
         if file.name.endswith('.csv'):
             # For large CSV files, use chunks
             try:
-                df = pd.read_csv(file)
+                # pyarrow parses the file on several threads
+                df = pd.read_csv(file, engine='pyarrow')
             except:
                 # If file is too large, read in chunks
+                file.seek(0)
                 chunks = []
                 for chunk in pd.read_csv(file, chunksize=10000):
                     chunks.append(chunk)
@@ -49,74 +69,59 @@ if uploaded_file is not None:
             df = pd.read_excel(file, engine='pyxlsb')
         return df
     
-    df = load_data(uploaded_file)
-    
-    # Data preprocessing function
-    @st.cache_data
-    def preprocess_data(df):
+    # Data preprocessing function; activity is measured from `today`
+    def preprocess_data(df, today):
         df_processed = df.copy()
         
         # Convert date columns
         date_columns = ['CIF_CREATION_DATE', 'CUSTOMER_RELATIONSHIP_DATE', 'AC_OPEN_DATE', 
                        'MOBILE_APP_REGISTRATION_DATE', 'LAST_TRX_DATE']
         
+        # The format is guessed once from the first value so the whole column
+        # parses on the fixed-format path (pandas infers as before if no guess)
         for col in date_columns:
-            if col in df_processed.columns:
-                df_processed[col] = pd.to_datetime(df_processed[col], errors='coerce')
-        
-        # Create registration status
-        def get_registration_status(row):
-            if pd.isna(row['MOBILE_APP_REGISTRATION_DATE']):
-                return 'Not Registered'
-            elif row['MOBILE_APP_REGISTRATION_DATE'] < row['AC_OPEN_DATE']:
-                return 'Already Registered'
-            else:
-                return 'Registered'
+            if col in df_processed.columns and not pd.api.types.is_datetime64_any_dtype(df_processed[col]):
+                first_value = df_processed[col].dropna().head(1)
+                date_format = guess_datetime_format(first_value.iloc[0]) if (
+                    len(first_value) and isinstance(first_value.iloc[0], str)) else None
+                df_processed[col] = pd.to_datetime(df_processed[col], errors='coerce', format=date_format)
         
-        df_processed['iNET_Registration_status'] = df_processed.apply(get_registration_status, axis=1)
+        # Create registration status (vectorised over both date columns;
+        # comparisons against a missing date are False, as in a row-wise check)
+        registration_date = df_processed['MOBILE_APP_REGISTRATION_DATE']
+        not_registered = registration_date.isna().to_numpy()
+        already_registered = (~not_registered) & (registration_date < df_processed['AC_OPEN_DATE']).to_numpy()
+        df_processed['iNET_Registration_status'] = pd.Categorical(
+            np.select([not_registered, already_registered], ['Not Registered', 'Already Registered'], default='Registered'),
+            categories=['Registered', 'Already Registered', 'Not Registered']
+        )
         
         # Calculate days to onboard
-        df_processed['days_to_onboard'] = (df_processed['MOBILE_APP_REGISTRATION_DATE'] - df_processed['AC_OPEN_DATE']).dt.days
-        
-        # Onboarding time categories
-        def categorize_onboarding_time(row):
-            if row['iNET_Registration_status'] in ['Already Registered', 'Not Registered']:
-                return None
-            days = row['days_to_onboard']
-            if pd.isna(days):
-                return None
-            elif days <= 7:
-                return 'Within 1 week'
-            elif days <= 15:
-                return 'Within 15 days'
-            elif days <= 30:
-                return '15-30 days'
-            elif days <= 60:
-                return 'Within 2 months'
-            elif days <= 90:
-                return 'Within 3 months'
-            elif days <= 180:
-                return 'Within 6 months'
-            else:
-                return 'More than 6 months'
+        df_processed['days_to_onboard'] = _whole_days(df_processed['MOBILE_APP_REGISTRATION_DATE'].to_numpy(),
+                                                      df_processed['AC_OPEN_DATE'].to_numpy())
         
-        df_processed['onboarding_time_category'] = df_processed.apply(categorize_onboarding_time, axis=1)
+        # Onboarding time categories: one searchsorted over the bucket upper
+        # edges gives each row's label code directly on the integer day counts
+        # (side='left' keeps the edges right-inclusive); only customers who
+        # registered after opening their account get a category
+        onboarding_edges = np.array([7, 15, 30, 60, 90, 180])
+        onboarding_labels = ['Within 1 week', 'Within 15 days', '15-30 days', 'Within 2 months',
+                             'Within 3 months', 'Within 6 months', 'More than 6 months']
+        days_to_onboard = df_processed['days_to_onboard']
+        onboarding_codes = np.searchsorted(onboarding_edges, days_to_onboard.to_numpy(dtype=np.int32, na_value=0), side='left')
+        no_category = days_to_onboard.isna().to_numpy() | (df_processed['iNET_Registration_status'] != 'Registered').to_numpy()
+        df_processed['onboarding_time_category'] = pd.Categorical.from_codes(
+            np.where(no_category, -1, onboarding_codes), categories=onboarding_labels, ordered=True
+        )
         
         # Calculate days since last transaction
-        current_date = pd.Timestamp.now()
-        df_processed['days_since_last_trx'] = (current_date - df_processed['LAST_TRX_DATE']).dt.days
-        
-        # Create activity status
-        conditions = [
-            (df_processed['days_since_last_trx'] <= 7),
-            (df_processed['days_since_last_trx'] <= 14),
-            (df_processed['days_since_last_trx'] <= 30),
-            (df_processed['days_since_last_trx'] <= 90),
-            (df_processed['days_since_last_trx'] <= 180),
-            (df_processed['days_since_last_trx'] <= 365),
-            (df_processed['days_since_last_trx'] > 365)
-        ]
+        df_processed['days_since_last_trx'] = _whole_days(today.to_datetime64(),
+                                                          df_processed['LAST_TRX_DATE'].to_numpy())
         
+        # Create activity status: one searchsorted over the upper day limits
+        # of each status (side='left' keeps the limits inclusive) instead of
+        # seven comparison passes; rows with no last transaction are 'Unknown'
+        activity_edges = np.array([7, 14, 30, 90, 180, 365])
         choices = [
             'Weekly Active',
             'Biweekly Active', 
@@ -124,19 +129,82 @@ if uploaded_file is not None:
             '3 Months Active',
             '6 Months Active',
             '1 Year Active',
-            'More than 1 Year'
+            'More than 1 Year',
+            'Unknown'
         ]
         
-        df_processed['Activity_Status'] = np.select(conditions, choices, default='Unknown')
+        days_since_last_trx = df_processed['days_since_last_trx']
+        activity_codes = np.where(
+            days_since_last_trx.isna().to_numpy(),
+            len(choices) - 1,
+            np.searchsorted(activity_edges, days_since_last_trx.to_numpy(dtype=np.int32, na_value=0), side='left')
+        )
+        df_processed['Activity_Status'] = pd.Categorical.from_codes(activity_codes, categories=choices, ordered=True)
         
         # Add year and month columns
-        df_processed['AC_OPEN_YEAR'] = df_processed['AC_OPEN_DATE'].dt.year
-        df_processed['AC_OPEN_MONTH'] = df_processed['AC_OPEN_DATE'].dt.month
+        df_processed['AC_OPEN_YEAR'] = df_processed['AC_OPEN_DATE'].dt.year.astype('Int16')
+        df_processed['AC_OPEN_MONTH'] = df_processed['AC_OPEN_DATE'].dt.month.astype('Int16')
+        
+        # Drop columns nothing reads and narrow the integer ones; the source
+        # float measures keep float64 because they are exported as-is
+        df_processed = df_processed[[col for col in df_processed.columns if col in USED_COLS]]
+        for col in df_processed.select_dtypes('integer').columns:
+            df_processed[col] = pd.to_numeric(df_processed[col], downcast='integer')
+        
+        # Low-cardinality labels as categoricals: equality tests, isin and
+        # groupby then run on small integer codes instead of Python strings
+        for col in ['REGION_DESC', 'INET_ELIGIBLE', 'BRANCH_NAME']:
+            if col in df_processed.columns:
+                df_processed[col] = df_processed[col].astype('category')
         
         return df_processed
     
+    # Processed frames are also cached on disk as Parquet, keyed on today's
+    # date (activity is measured from today) and a hash of the upload's
+    # content, so a cold start skips both the file parse and the preprocessing
+    # while a corrected file never hits an old entry. Within a session the
+    # frame is held in memory under the same key, so reruns never touch the
+    # file again. This is the only cache layer: loading and preprocessing run
+    # only when it misses, always against today's date
+    CACHE_DIR = os.path.join(tempfile.gettempdir(), 'inet_dashboard_cache')
+    CACHE_MAX_FILES = 4
+    
+    def prune_cache(today):
+        # Entries from earlier days can never be hit again; of today's, only
+        # the most recently used few are kept
+        entries = sorted((entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.parquet')),
+                         key=lambda entry: entry.stat().st_mtime, reverse=True)
+        kept = [entry.path for entry in entries if entry.name.startswith(f"{today.date()}_")][:CACHE_MAX_FILES]
+        for entry in entries:
+            if entry.path not in kept:
+                os.remove(entry.path)
+    
+    @st.cache_data(show_spinner=False, max_entries=2)
+    def load_processed(key, today, _file):
+        cache_path = os.path.join(CACHE_DIR, f"{key}.parquet")
+        if os.path.exists(cache_path):
+            os.utime(cache_path)  # marks the entry as recently used for pruning
+            return pd.read_parquet(cache_path, engine='pyarrow')
+        
+        df_processed = preprocess_data(load_data(_file), today)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            df_processed.reset_index(drop=True).to_parquet(cache_path, engine='pyarrow', compression='snappy', index=False)
+            prune_cache(today)
+        except Exception as e:
+            st.warning(f"Could not write Parquet cache: {str(e)}")
+        return df_processed
+    
     # Process data
-    df_processed = preprocess_data(df)
+    # The digest is computed once per upload (file_id changes with every
+    # upload) and kept in the session, so reruns from widget clicks don't
+    # rehash the file
+    if st.session_state.get('upload_file_id') != uploaded_file.file_id:
+        st.session_state.upload_file_id = uploaded_file.file_id
+        st.session_state.upload_digest = hashlib.md5(uploaded_file.getvalue()).hexdigest()
+    today = pd.Timestamp.today().normalize()
+    data_key = f"{today.date()}_{st.session_state.upload_digest}"
+    df_processed = load_processed(data_key, today, uploaded_file)
     
     # Sidebar for filters
     st.sidebar.header("🔍 Filters")
@@ -152,12 +220,25 @@ if uploaded_file is not None:
     regions = ['All'] + sorted(df_processed['REGION_DESC'].dropna().unique().tolist())
     selected_region = st.sidebar.selectbox("Select Region", regions)
     
-    # Apply filters
-    filtered_df = df_processed.copy()
+    # Row positions of every year and region, grouped once per data set and
+    # shared across reruns, so applying a filter is a take rather than a
+    # fresh mask over the whole column
+    @st.cache_resource(show_spinner=False, max_entries=4)
+    def filter_rows(_df, data_key):
+        year_rows = _df.groupby('AC_OPEN_YEAR', observed=True).indices
+        region_rows = _df.groupby('REGION_DESC', observed=True).indices
+        return year_rows, region_rows
+    
+    # Apply filters; filtered_df is only read below, so the unfiltered view
+    # is the processed frame itself
+    year_rows, region_rows = filter_rows(df_processed, data_key)
+    rows = None
     if selected_year != 'All':
-        filtered_df = filtered_df[filtered_df['AC_OPEN_YEAR'] == selected_year]
+        rows = year_rows.get(selected_year, np.array([], dtype=np.intp))
     if selected_region != 'All':
-        filtered_df = filtered_df[filtered_df['REGION_DESC'] == selected_region]
+        region_selection = region_rows.get(selected_region, np.array([], dtype=np.intp))
+        rows = region_selection if rows is None else np.intersect1d(rows, region_selection, assume_unique=True)
+    filtered_df = df_processed if rows is None else df_processed.take(rows)
     
     # Store all figures for Excel export
     figures = {}
@@ -165,19 +246,22 @@ if uploaded_file is not None:
     # Main dashboard
     st.header("📊 Dashboard Overview")
     
-    # Key metrics
+    # Key metrics, counted once from masks over the categorical codes; the
+    # funnel tab reuses the same counts
+    total_customers = len(filtered_df)
+    inet_eligible = int((filtered_df['INET_ELIGIBLE'] == 'Y').sum())
+    registered_customers = int((filtered_df['iNET_Registration_status'] == 'Registered').sum())
+    active_users = int(filtered_df['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active']).sum())
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_customers = len(filtered_df)
         st.metric("Total Customers", f"{total_customers:,}")
     
     with col2:
-        inet_eligible = len(filtered_df[filtered_df['INET_ELIGIBLE'] == 'Y'])
         st.metric("iNET Eligible", f"{inet_eligible:,}")
     
     with col3:
-        registered_customers = len(filtered_df[filtered_df['iNET_Registration_status'] == 'Registered'])
         if inet_eligible > 0:
             adoption_rate = (registered_customers / inet_eligible) * 100
             st.metric("Adoption Rate", f"{adoption_rate:.1f}%")
@@ -185,44 +269,113 @@ if uploaded_file is not None:
             st.metric("Adoption Rate", "0%")
     
     with col4:
-        active_users = len(filtered_df[filtered_df['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active'])])
         if registered_customers > 0:
             active_rate = (active_users / registered_customers) * 100
             st.metric("Active User Rate", f"{active_rate:.1f}%")
         else:
             st.metric("Active User Rate", "0%")
     
-    # Tab layout
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🌍 Regional Analysis", "📈 Adoption Funnel", "⏱️ Onboarding Timeline", "📊 Activity Analysis", "📈 Trends", "📅 YoY Comparison"])
-    
-    with tab1:
-        st.subheader("Regional iNET Adoption Analysis")
-        
+    # Tab computations, cached per (data, year, region): reruns triggered by
+    # other widgets reuse the grouped tables and built figures. filtered_df is
+    # passed unhashed since the key arguments already identify it
+    @st.cache_data(show_spinner=False)
+    def regional_analysis(_filtered_df, data_key, year, region):
         # Regional adoption rates
-        regional_stats = filtered_df.groupby('REGION_DESC').agg({
-            'CUSTOMER_NO': 'count',
-            'INET_ELIGIBLE': lambda x: (x == 'Y').sum(),
-            'iNET_Registration_status': lambda x: (x == 'Registered').sum()
-        }).rename(columns={
-            'CUSTOMER_NO': 'Total_Customers',
-            'INET_ELIGIBLE': 'Eligible_Customers',
-            'iNET_Registration_status': 'Registered_Customers'
-        })
+        # Indicator columns let all three counts run as one Cython groupby
+        regional_stats = _filtered_df[['REGION_DESC', 'CUSTOMER_NO']].assign(
+            _elig=(_filtered_df['INET_ELIGIBLE'] == 'Y').astype('int32'),
+            _reg=(_filtered_df['iNET_Registration_status'] == 'Registered').astype('int32')
+        ).groupby('REGION_DESC', observed=True).agg(
+            Total_Customers=('CUSTOMER_NO', 'count'),
+            Eligible_Customers=('_elig', 'sum'),
+            Registered_Customers=('_reg', 'sum')
+        )
         
         regional_stats['Adoption_Rate'] = (regional_stats['Registered_Customers'] / regional_stats['Eligible_Customers'] * 100).round(2)
         regional_stats['Eligibility_Rate'] = (regional_stats['Eligible_Customers'] / regional_stats['Total_Customers'] * 100).round(2)
         
-        # Regional adoption rate chart
-        fig_regional = px.bar(
-            regional_stats.reset_index(),
-            x='REGION_DESC',
-            y='Adoption_Rate',
+        # Regional adoption rate chart, built from the small grouped arrays
+        # directly rather than through plotly.express's long-form frame
+        adoption_rate = regional_stats['Adoption_Rate'].to_numpy()
+        fig_regional = go.Figure(go.Bar(
+            x=regional_stats.index.to_numpy(),
+            y=adoption_rate,
+            marker=dict(color=adoption_rate, colorscale='Viridis', showscale=True,
+                        colorbar=dict(title='Adoption Rate (%)'))
+        ))
+        fig_regional.update_layout(
             title='iNET Adoption Rate by Region',
-            labels={'Adoption_Rate': 'Adoption Rate (%)', 'REGION_DESC': 'Region'},
-            color='Adoption_Rate',
-            color_continuous_scale='viridis'
+            xaxis_title='Region',
+            yaxis_title='Adoption Rate (%)',
+            xaxis_tickangle=-45
+        )
+        return regional_stats, fig_regional
+    
+    @st.cache_data(show_spinner=False)
+    def onboarding_analysis(_filtered_df, data_key, year, region):
+        # Days to onboard by region; None when nobody in the selection registered
+        onboard_data = _filtered_df[_filtered_df['iNET_Registration_status'] == 'Registered']
+        if onboard_data.empty:
+            return None
+        
+        regional_onboard = onboard_data.groupby('REGION_DESC', observed=True)['days_to_onboard'].agg(['median', 'mean']).round(2)
+        
+        fig_onboard = make_subplots(specs=[[{"secondary_y": True}]])
+        
+        fig_onboard.add_trace(
+            go.Bar(name='Median Days', x=regional_onboard.index, y=regional_onboard['median']),
+            secondary_y=False,
+        )
+        
+        fig_onboard.add_trace(
+            go.Scatter(name='Mean Days', x=regional_onboard.index, y=regional_onboard['mean'], mode='lines+markers'),
+            secondary_y=True,
+        )
+        
+        fig_onboard.update_xaxes(title_text="Region", tickangle=-45)
+        fig_onboard.update_yaxes(title_text="Median Days", secondary_y=False)
+        fig_onboard.update_yaxes(title_text="Mean Days", secondary_y=True)
+        fig_onboard.update_layout(title='Days to Onboard by Region')
+        return fig_onboard
+    
+    @st.cache_data(show_spinner=False)
+    def activity_analysis(_filtered_df, data_key, year, region):
+        # Activity status distribution
+        activity_counts = _filtered_df['Activity_Status'].value_counts()
+        activity_counts = activity_counts[activity_counts > 0]
+        fig_activity = go.Figure(go.Bar(
+            x=activity_counts.to_numpy(),
+            y=activity_counts.index.astype(str).to_numpy(),
+            orientation='h'
+        ))
+        fig_activity.update_layout(
+            title='Customer Activity Distribution',
+            xaxis_title='Number of Customers',
+            yaxis_title='Activity Status'
         )
-        fig_regional.update_layout(xaxis_tickangle=-45)
+        return fig_activity
+    
+    @st.cache_data(show_spinner=False)
+    def monthly_trends(_filtered_df, data_key, year, region):
+        monthly_reg = _filtered_df.groupby([_filtered_df['AC_OPEN_YEAR'], _filtered_df['AC_OPEN_MONTH']]).size()
+        monthly_reg = monthly_reg.reset_index(name='count')
+        monthly_reg['Date'] = pd.to_datetime(monthly_reg[['AC_OPEN_YEAR', 'AC_OPEN_MONTH']].rename(columns={'AC_OPEN_YEAR': 'year', 'AC_OPEN_MONTH': 'month'}).assign(day=1))
+        
+        return px.line(
+            monthly_reg,
+            x='Date',
+            y='count',
+            title='Monthly Customer Registration Trends',
+            labels={'count': 'Number of Registrations'}
+        )
+    
+    # Tab layout
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🌍 Regional Analysis", "📈 Adoption Funnel", "⏱️ Onboarding Timeline", "📊 Activity Analysis", "📈 Trends", "📅 YoY Comparison"])
+    
+    with tab1:
+        st.subheader("Regional iNET Adoption Analysis")
+        
+        regional_stats, fig_regional = regional_analysis(filtered_df, data_key, selected_year, selected_region)
         st.plotly_chart(fig_regional, use_container_width=True)
         figures['regional_adoption'] = fig_regional
         
@@ -234,14 +387,9 @@ if uploaded_file is not None:
         st.subheader("Customer Adoption Funnel")
         
         # Overall funnel
-        total_customers = len(filtered_df)
-        eligible_customers = len(filtered_df[filtered_df['INET_ELIGIBLE'] == 'Y'])
-        registered_customers = len(filtered_df[filtered_df['iNET_Registration_status'] == 'Registered'])
-        active_customers = len(filtered_df[filtered_df['Activity_Status'].isin(['Weekly Active', 'Biweekly Active', 'Monthly Active'])])
-        
         funnel_fig = go.Figure(go.Funnel(
             y=['Total Customers', 'iNET Eligible', 'Registered', 'Active Users'],
-            x=[total_customers, eligible_customers, registered_customers, active_customers],
+            x=[total_customers, inet_eligible, registered_customers, active_users],
             textinfo="value+percent initial",
             marker_color=['lightblue', 'orange', 'green', 'red']
         ))
@@ -256,44 +404,15 @@ if uploaded_file is not None:
     with tab3:
         st.subheader("Onboarding Timeline Analysis")
         
-        # Days to onboard by region
-        onboard_data = filtered_df[filtered_df['iNET_Registration_status'] == 'Registered'].copy()
-        
-        if not onboard_data.empty:
-            regional_onboard = onboard_data.groupby('REGION_DESC')['days_to_onboard'].agg(['median', 'mean']).round(2)
-            
-            fig_onboard = make_subplots(specs=[[{"secondary_y": True}]])
-            
-            fig_onboard.add_trace(
-                go.Bar(name='Median Days', x=regional_onboard.index, y=regional_onboard['median']),
-                secondary_y=False,
-            )
-            
-            fig_onboard.add_trace(
-                go.Scatter(name='Mean Days', x=regional_onboard.index, y=regional_onboard['mean'], mode='lines+markers'),
-                secondary_y=True,
-            )
-            
-            fig_onboard.update_xaxes(title_text="Region", tickangle=-45)
-            fig_onboard.update_yaxes(title_text="Median Days", secondary_y=False)
-            fig_onboard.update_yaxes(title_text="Mean Days", secondary_y=True)
-            fig_onboard.update_layout(title='Days to Onboard by Region')
-            
+        fig_onboard = onboarding_analysis(filtered_df, data_key, selected_year, selected_region)
+        if fig_onboard is not None:
             st.plotly_chart(fig_onboard, use_container_width=True)
             figures['onboarding_by_region'] = fig_onboard
     
     with tab4:
         st.subheader("Customer Activity Analysis")
         
-        # Activity status distribution
-        activity_counts = filtered_df['Activity_Status'].value_counts()
-        fig_activity = px.bar(
-            x=activity_counts.values,
-            y=activity_counts.index,
-            orientation='h',
-            title='Customer Activity Distribution',
-            labels={'x': 'Number of Customers', 'y': 'Activity Status'}
-        )
+        fig_activity = activity_analysis(filtered_df, data_key, selected_year, selected_region)
         st.plotly_chart(fig_activity, use_container_width=True)
         figures['activity_distribution'] = fig_activity
     
@@ -302,17 +421,7 @@ if uploaded_file is not None:
         
         # Fixed: Monthly registration trends
         if 'AC_OPEN_DATE' in filtered_df.columns:
-            monthly_reg = filtered_df.groupby([filtered_df['AC_OPEN_YEAR'], filtered_df['AC_OPEN_MONTH']]).size()
-            monthly_reg = monthly_reg.reset_index(name='count')
-            monthly_reg['Date'] = pd.to_datetime(monthly_reg[['AC_OPEN_YEAR', 'AC_OPEN_MONTH']].rename(columns={'AC_OPEN_YEAR': 'year', 'AC_OPEN_MONTH': 'month'}).assign(day=1))
-            
-            fig_trends = px.line(
-                monthly_reg,
-                x='Date',
-                y='count',
-                title='Monthly Customer Registration Trends',
-                labels={'count': 'Number of Registrations'}
-            )
+            fig_trends = monthly_trends(filtered_df, data_key, selected_year, selected_region)
             st.plotly_chart(fig_trends, use_container_width=True)
             figures['monthly_trends'] = fig_trends
     
@@ -329,13 +438,13 @@ if uploaded_file is not None:
             # Create comparison chart
             fig_yoy = go.Figure()
             
-            for year in monthly_counts['AC_OPEN_YEAR'].unique():
-                year_data = monthly_counts[monthly_counts['AC_OPEN_YEAR'] == year]
+            for year, year_data in monthly_counts.groupby('AC_OPEN_YEAR', sort=False):
+                year_counts = year_data['Count'].to_numpy()
                 fig_yoy.add_trace(go.Bar(
-                    x=year_data['AC_OPEN_MONTH'],
-                    y=year_data['Count'],
+                    x=year_data['AC_OPEN_MONTH'].to_numpy(),
+                    y=year_counts,
                     name=str(int(year)),
-                    text=year_data['Count'],
+                    text=year_counts,
                     textposition='auto',
                 ))
             
@@ -369,7 +478,17 @@ if uploaded_file is not None:
     def create_excel_download(dataframe, figures, year_filter):
         output = BytesIO()
         
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        # constant_memory flushes each row as soon as the next one starts, so
+        # the workbook never holds the whole Customer_Data sheet; every sheet
+        # must then be written in row order, which the streamed rows below are
+        workbook_options = {
+            'constant_memory': True,
+            'use_zip64': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+            'strings_to_urls': False,
+            'strings_to_formulas': False
+        }
+        with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': workbook_options}) as writer:
             workbook = writer.book
             
             # Create Summary sheet with graphs
@@ -391,8 +510,12 @@ if uploaded_file is not None:
             # Export figures as images (placeholder for actual implementation)
             summary_sheet.write('A9', 'Visualizations are available in the Streamlit dashboard', metric_format)
             
-            # Write filtered data
-            dataframe.to_excel(writer, sheet_name='Customer_Data', index=False)
+            # Write filtered data row by row (to_excel writes column by column,
+            # which constant_memory mode cannot accept)
+            data_sheet = workbook.add_worksheet('Customer_Data')
+            writer.sheets['Customer_Data'] = data_sheet
+            header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+            write_dataframe_rows(data_sheet, dataframe, header_format)
             
             # Regional Stats
             if 'regional_stats' in locals():
@@ -418,10 +541,9 @@ if uploaded_file is not None:
                 selected_year if selected_year != 'All' else 'All Years'
             )
             
-            b64 = base64.b64encode(excel_file.read()).decode()
             filename = f"iNET_Dashboard_{selected_year if selected_year != 'All' else 'All'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}">Download Excel File</a>'
-            st.markdown(href, unsafe_allow_html=True)
+            st.download_button("Download Excel File", data=excel_file.getvalue(), file_name=filename,
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
     
     # Questions Section
     st.header("🔍 Key Questions & Insights")
@@ -8,10 +8,15 @@ import seaborn as sns
 from datetime import datetime
 import os
 import gc
+from preprocess_large_csv import parse_dates
 
 # File path - update this to your file location
 FILE_PATH = r"C:\Users\mehak.rafiq.ASKARIBANK\Documents\Projects\model_data\Daily_Dashboard_NTB\Data\Customer-Level-Account Holder Detail Report -2603_Report2 (6).csv"
 
+# Date formats are guessed once per column from the first value seen and
+# reused for every chunk, so each chunk parses on the fixed-format path
+date_formats = {}
+
 #%% [markdown]
 # ## 1. Quick File Analysis
 
@@ -20,9 +25,17 @@ FILE_PATH = r"C:\Users\mehak.rafiq.ASKARIBANK\Documents\Projects\model_data\Dail
 file_size_mb = os.path.getsize(FILE_PATH) / (1024**2)
 print(f"File size: {file_size_mb:.2f} MB")
 
-# Count rows without loading entire file
+# Count rows without loading entire file: count newline bytes in 16 MB blocks
+# instead of decoding and iterating the file line by line
 print("Counting rows...")
-row_count = sum(1 for line in open(FILE_PATH, 'r', encoding='utf-8')) - 1
+newline_count = 0
+last_block = b''
+with open(FILE_PATH, 'rb') as f:
+    for block in iter(lambda: f.read(16 * 1024 * 1024), b''):
+        newline_count += block.count(b'\n')
+        last_block = block
+# A final line without a trailing newline is still a row
+row_count = newline_count + (1 if last_block and not last_block.endswith(b'\n') else 0) - 1
 print(f"Total rows: {row_count:,}")
 
 #%% [markdown]
@@ -33,11 +46,12 @@ print(f"Total rows: {row_count:,}")
 sample_size = 100000
 print(f"Creating sample with {sample_size:,} rows...")
 
-# Method 1: Random sampling
-skip_rows = sorted(np.random.choice(range(1, row_count), 
-                                  row_count - sample_size, 
-                                  replace=False))
-df_sample = pd.read_csv(FILE_PATH, skiprows=skip_rows)
+# Method 1: Random sampling. Only the sample_size kept line numbers are drawn
+# (header is line 0), and rows are skipped as the file streams, so no
+# row_count-sized skip list is ever built or sorted
+rng = np.random.default_rng(42)
+keep_rows = set((rng.choice(row_count, size=min(sample_size, row_count), replace=False) + 1).tolist())
+df_sample = pd.read_csv(FILE_PATH, skiprows=lambda i: i > 0 and i not in keep_rows)
 
 # Save sample
 output_path = FILE_PATH.replace('.csv', '_sample_100k.csv')
@@ -53,36 +67,37 @@ gc.collect()
 # ## 3. Option B: Split by Year
 
 #%%
-# Process file in chunks and split by year
+# Process file in chunks and split by year. Each year's rows are appended to
+# its file as soon as a chunk is split, so only one chunk is ever in memory
 chunk_size = 50000
-yearly_files = {}
+output_dir = os.path.dirname(FILE_PATH)
+yearly_rows = {}
 
 print(f"Processing file in chunks of {chunk_size:,} rows...")
 
 for i, chunk in enumerate(pd.read_csv(FILE_PATH, chunksize=chunk_size)):
     # Convert date
-    chunk['AC_OPEN_DATE'] = pd.to_datetime(chunk['AC_OPEN_DATE'], errors='coerce')
+    chunk['AC_OPEN_DATE'] = parse_dates(chunk['AC_OPEN_DATE'], date_formats)
     chunk['year'] = chunk['AC_OPEN_DATE'].dt.year
     
-    # Group by year
+    # Group by year and append to that year's file (header on first write)
     for year, year_data in chunk.groupby('year'):
         if pd.notna(year):
             year = int(year)
-            if year not in yearly_files:
-                yearly_files[year] = []
-            yearly_files[year].append(year_data.drop('year', axis=1))
+            year_path = os.path.join(output_dir, f'customer_data_{year}.csv')
+            first_write = year not in yearly_rows
+            year_data.drop('year', axis=1).to_csv(year_path, mode='w' if first_write else 'a',
+                                                  header=first_write, index=False)
+            yearly_rows[year] = yearly_rows.get(year, 0) + len(year_data)
     
     # Progress
     if i % 10 == 0:
         print(f"Processed {(i+1) * chunk_size:,} rows...")
 
-# Save yearly files
-output_dir = os.path.dirname(FILE_PATH)
-for year, chunks in yearly_files.items():
-    year_df = pd.concat(chunks, ignore_index=True)
+# Report yearly files
+for year, rows in yearly_rows.items():
     year_path = os.path.join(output_dir, f'customer_data_{year}.csv')
-    year_df.to_csv(year_path, index=False)
-    print(f"Saved {year}: {len(year_df):,} rows ({os.path.getsize(year_path)/(1024**2):.1f} MB)")
+    print(f"Saved {year}: {rows:,} rows ({os.path.getsize(year_path)/(1024**2):.1f} MB)")
 
 #%% [markdown]
 # ## 4. Option C: Create Summary Statistics File
@@ -94,51 +109,70 @@ summary_list = []
 
 print("Creating summary statistics...")
 
-for chunk in pd.read_csv(FILE_PATH, chunksize=chunk_size):
+# The summary needs only these columns; parsing just them keeps every chunk
+# small and skips tokenising the rest of each row into Python objects
+summary_columns = ['CUSTOMER_NO', 'REGION_DESC', 'INET_ELIGIBLE', 'AC_OPEN_DATE',
+                   'MOBILE_APP_REGISTRATION_DATE', 'AGE', 'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE']
+
+for chunk in pd.read_csv(FILE_PATH, chunksize=chunk_size, usecols=summary_columns):
     # Convert dates
-    chunk['AC_OPEN_DATE'] = pd.to_datetime(chunk['AC_OPEN_DATE'], errors='coerce')
-    chunk['MOBILE_APP_REGISTRATION_DATE'] = pd.to_datetime(chunk['MOBILE_APP_REGISTRATION_DATE'], errors='coerce')
+    chunk['AC_OPEN_DATE'] = parse_dates(chunk['AC_OPEN_DATE'], date_formats)
+    chunk['MOBILE_APP_REGISTRATION_DATE'] = parse_dates(chunk['MOBILE_APP_REGISTRATION_DATE'], date_formats)
     
-    # Add month/year
-    chunk['year_month'] = chunk['AC_OPEN_DATE'].dt.to_period('M')
+    # Add month/year as an integer month count since 1970-01, which is the
+    # ordinal a monthly Period uses, so the groupbys key on plain numbers;
+    # rows with no opening date get NaN and are dropped, as NaT periods were.
+    # The cast goes from the column's own unit, so sentinels like 9999-12-31
+    # don't wrap around the nanosecond range
+    open_date = chunk['AC_OPEN_DATE'].to_numpy()
+    chunk['year_month'] = np.where(np.isnat(open_date), np.nan,
+                                   open_date.astype('datetime64[M]').astype(np.int64))
     
-    # Calculate registration status
+    # Calculate registration status and an eligibility flag, so every
+    # aggregation below is a built-in rather than a per-group lambda
     chunk['is_registered'] = chunk['MOBILE_APP_REGISTRATION_DATE'].notna()
+    chunk['inet_eligible_flag'] = (chunk['INET_ELIGIBLE'].values == 'Y').astype(np.int32)
     
-    # Aggregate
-    summary = chunk.groupby(['REGION_DESC', 'year_month']).agg({
-        'CUSTOMER_NO': 'count',
-        'INET_ELIGIBLE': lambda x: (x == 'Y').sum(),
-        'is_registered': 'sum',
-        'AGE': ['mean', 'median'],
-        'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE': ['mean', 'median', 'sum']
-    }).reset_index()
+    # Aggregate to sums and counts, which add up exactly across chunks, so the
+    # means can be finished after a single combining groupby
+    summary = chunk.groupby(['REGION_DESC', 'year_month']).agg(
+        total_customers=('CUSTOMER_NO', 'count'),
+        inet_eligible=('inet_eligible_flag', 'sum'),
+        registered=('is_registered', 'sum'),
+        age_sum=('AGE', 'sum'),
+        age_count=('AGE', 'count'),
+        median_age=('AGE', 'median'),
+        total_balance=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'sum'),
+        balance_count=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'count'),
+        median_balance=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'median')
+    ).reset_index()
     
     summary_list.append(summary)
 
-# Combine summaries
-final_summary = pd.concat(summary_list)
-
-# Flatten column names
-final_summary.columns = ['_'.join(col).strip('_') if col[1] else col[0] 
-                        for col in final_summary.columns.values]
-
-# Group again for final aggregation
-final_summary = final_summary.groupby(['REGION_DESC', 'year_month']).agg({
-    'CUSTOMER_NO_count': 'sum',
-    'INET_ELIGIBLE_<lambda>': 'sum',
-    'is_registered_sum': 'sum',
-    'AGE_mean': 'mean',
-    'AGE_median': 'mean',
-    'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE_mean': 'mean',
-    'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE_median': 'mean',
-    'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE_sum': 'sum'
-}).reset_index()
-
-# Rename columns
-final_summary.columns = ['REGION_DESC', 'year_month', 'total_customers', 'inet_eligible',
-                        'registered', 'avg_age', 'median_age', 'avg_balance', 
-                        'median_balance', 'total_balance']
+# Combine summaries in one pass; medians do not decompose, so they stay the
+# average of the per-chunk medians
+final_summary = pd.concat(summary_list).groupby(['REGION_DESC', 'year_month']).agg(
+    total_customers=('total_customers', 'sum'),
+    inet_eligible=('inet_eligible', 'sum'),
+    registered=('registered', 'sum'),
+    age_sum=('age_sum', 'sum'),
+    age_count=('age_count', 'sum'),
+    median_age=('median_age', 'mean'),
+    total_balance=('total_balance', 'sum'),
+    balance_count=('balance_count', 'sum'),
+    median_balance=('median_balance', 'mean')
+).reset_index()
+
+# Back to monthly periods for the output (one per summary row, so building them
+# one by one is cheap), and means from the combined sums and counts
+final_summary['year_month'] = pd.PeriodIndex(
+    [pd.Period(ordinal=month, freq='M') for month in final_summary['year_month'].astype(np.int64)], freq='M'
+)
+final_summary['avg_age'] = final_summary['age_sum'] / final_summary['age_count']
+final_summary['avg_balance'] = final_summary['total_balance'] / final_summary['balance_count']
+final_summary = final_summary[['REGION_DESC', 'year_month', 'total_customers', 'inet_eligible',
+                               'registered', 'avg_age', 'median_age', 'avg_balance',
+                               'median_balance', 'total_balance']]
 
 # Save summary
 summary_path = FILE_PATH.replace('.csv', '_summary_stats.csv')
@@ -214,7 +248,7 @@ def analyze_large_file_efficiently(file_path, analysis_func, chunk_size=50000):
 
 # Example: Get registration stats by branch
 def get_branch_stats(df):
-    df['MOBILE_APP_REGISTRATION_DATE'] = pd.to_datetime(df['MOBILE_APP_REGISTRATION_DATE'], errors='coerce')
+    df['MOBILE_APP_REGISTRATION_DATE'] = parse_dates(df['MOBILE_APP_REGISTRATION_DATE'], date_formats)
     df['is_registered'] = df['MOBILE_APP_REGISTRATION_DATE'].notna()
     
     return df.groupby('BRANCH_NAME').agg({
@@ -243,10 +277,10 @@ print("\n📊 Files created for dashboard use:")
 print(f"1. Sample file (100k rows): {output_path}")
 print(f"2. Summary statistics: {summary_path}")
 print("3. Yearly files:")
-for year in sorted(yearly_files.keys()):
+for year in sorted(yearly_rows):
     year_file = os.path.join(output_dir, f'customer_data_{year}.csv')
     if os.path.exists(year_file):
         size_mb = os.path.getsize(year_file) / (1024**2)
-        print(f"   - {year}: {size_mb:.1f} MB")
+        print(f"   - {year}: {yearly_rows[year]:,} rows, {size_mb:.1f} MB")
 
 print("\n✅ You can now use any of these smaller files in the Streamlit dashboard!")
@@ -5,14 +5,67 @@ This script helps prepare large files for the iNET dashboard
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from pandas.tseries.api import guess_datetime_format
 import os
 import sys
+import csv
+import mmap
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import argparse
 
-def preprocess_large_csv(input_file, output_dir='./processed_data'):
+# Read-time types for the low-cardinality labels, which arrive dictionary-
+# encoded (pandas category); every other column is carried as text, so the
+# yearly, recent and sample files write each value exactly as it was read
+READ_TYPES = {
+    'REGION_DESC': pa.dictionary(pa.int32(), pa.string()),
+    'BRANCH_NAME': pa.dictionary(pa.int32(), pa.string()),
+    'INET_ELIGIBLE': pa.dictionary(pa.int32(), pa.string())
+}
+
+
+def read_csv_chunks(input_file, columns, block_size=64 << 20):
+    """
+    Stream the CSV as pandas chunks parsed by pyarrow's multi-threaded reader.
+    Column types are pinned up front (READ_TYPES, the rest as text), so a
+    column that is empty in the first block cannot be inferred as the wrong
+    type and fail on a later one; missing values use pandas' markers
+    """
+    column_types = {col: READ_TYPES.get(col, pa.string()) for col in columns}
+    reader = pa_csv.open_csv(
+        input_file,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def parse_dates(values, date_formats):
     """
-    Process large CSV file and create smaller, manageable outputs
+    pd.to_datetime(errors='coerce') with the column's format fixed after its
+    first value. date_formats maps column name to format and is filled in as
+    formats are guessed, so passing the same dict for every chunk guesses
+    once per column and keeps each chunk on the fixed-format path
+    """
+    if values.name not in date_formats:
+        first_value = values.dropna().head(1)
+        if len(first_value) and isinstance(first_value.iloc[0], str):
+            # Unguessable values (e.g. a stray bad first cell) leave the column
+            # to be tried again on the next chunk
+            date_format = guess_datetime_format(first_value.iloc[0])
+            if date_format:
+                date_formats[values.name] = date_format
+    return pd.to_datetime(values, errors='coerce', format=date_formats.get(values.name))
+
+def preprocess_large_csv(input_file, output_dir='./processed_data', workers=None):
+    """
+    Process large CSV file and create smaller, manageable outputs.
+    The summary is aggregated in `workers` processes (half the cores by
+    default; 1 keeps everything in this process)
     """
     print(f"Starting to process: {input_file}")
     
@@ -23,144 +76,283 @@ def preprocess_large_csv(input_file, output_dir='./processed_data'):
     file_size = os.path.getsize(input_file) / (1024**3)  # Size in GB
     print(f"File size: {file_size:.2f} GB")
     
-    # Count total rows
-    print("Counting rows...")
-    total_rows = sum(1 for line in open(input_file, 'r', encoding='utf-8')) - 1
-    print(f"Total rows: {total_rows:,}")
-    
     # Read column names
-    columns = pd.read_csv(input_file, nrows=0).columns.tolist()
+    columns = read_header(input_file)
     print(f"Columns found: {len(columns)}")
     
-    # Option 1: Create yearly files
-    print("\n📅 Creating yearly files...")
-    create_yearly_files(input_file, output_dir, total_rows)
-    
-    # Option 2: Create sample file
-    print("\n📊 Creating sample file...")
-    create_sample_file(input_file, output_dir, sample_size=100000)
+    # Date formats guessed so far, shared by every chunk of this pass
+    date_formats = {}
     
-    # Option 3: Create summary statistics
-    print("\n📈 Creating summary statistics...")
-    create_summary_stats(input_file, output_dir)
+    # All four outputs share a single read of the file: every chunk is handed
+    # to each output in turn, and rows are counted as they arrive
+    print("\n📅 Creating yearly files, sample file, summary statistics and recent data file...")
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // 2)
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
     
-    # Option 4: Create filtered file (last 2 years)
-    print("\n🔍 Creating recent data file...")
-    create_recent_data_file(input_file, output_dir)
+    # The pool is shut down however the pass ends, cancelling any chunks
+    # still queued if a read or a write fails part way
+    try:
+        sampler = ReservoirSampler(output_dir, sample_size=100000)
+        outputs = [YearlyWriter(output_dir), SummaryAggregator(output_dir, executor, max_pending=2 * workers),
+                   RecentFilterWriter(output_dir)]
+        total_rows = 0
+        
+        for chunk in read_csv_chunks(input_file, columns):
+            # The sample keeps the rows exactly as read
+            sampler.add(chunk)
+            
+            # Convert date column (once, for every other output)
+            chunk['AC_OPEN_DATE'] = parse_dates(chunk['AC_OPEN_DATE'], date_formats)
+            
+            for output in outputs:
+                output.add(chunk)
+            
+            # Progress update
+            total_rows += len(chunk)
+            print(f"  Processed {total_rows:,} rows", end='\r')
+        
+        print()  # New line after progress
+        print(f"Total rows: {total_rows:,}")
+        
+        for output in [sampler] + outputs:
+            output.close()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
     
     print("\n✅ Processing complete! Files saved in:", output_dir)
 
 
-def create_yearly_files(input_file, output_dir, total_rows):
-    """Split data by year"""
-    chunk_size = 50000
-    yearly_data = {}
+class ReservoirSampler:
+    """Create a random sample of the data in the same pass as the other outputs"""
     
-    # Process in chunks
-    for i, chunk in enumerate(pd.read_csv(input_file, chunksize=chunk_size)):
-        # Convert date column
-        chunk['AC_OPEN_DATE'] = pd.to_datetime(chunk['AC_OPEN_DATE'], errors='coerce')
-        chunk['year'] = chunk['AC_OPEN_DATE'].dt.year
+    def __init__(self, output_dir, sample_size=100000, seed=42):
+        self.output_dir = output_dir
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.rows_seen = 0
+        self.keys = np.empty(0)
+        self.sample = None  # sampled rows, indexed by their row number in the file
+    
+    def add(self, chunk):
+        # Every row draws a uniform random key and the sample is the rows with
+        # the sample_size smallest keys, which is a uniform sample without
+        # replacement; once the reservoir is full, only rows whose key beats its
+        # current largest key are considered
+        keys = self.rng.random(len(chunk))
+        rows = chunk.set_axis(np.arange(self.rows_seen, self.rows_seen + len(chunk)))
+        self.rows_seen += len(chunk)
+        if len(self.keys) == self.sample_size:
+            candidates = keys < self.keys.max()
+            if not candidates.any():
+                return
+            keys, rows = keys[candidates], rows[candidates]
         
-        # Group by year
-        for year, year_data in chunk.groupby('year'):
+        keys = np.concatenate([self.keys, keys])
+        rows = rows if self.sample is None else pd.concat([self.sample, rows])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size - 1)[:self.sample_size]
+            keys, rows = keys[keep], rows.iloc[keep]
+        self.keys, self.sample = keys, rows
+    
+    def close(self):
+        # Save sample, in file order
+        if self.sample is not None:
+            df_sample = self.sample.sort_index()
+            output_file = os.path.join(self.output_dir, 'customer_data_sample.csv')
+            df_sample.to_csv(output_file, index=False)
+            print(f"  Saved sample: {len(df_sample):,} rows -> {output_file}")
+
+
+class YearlyWriter:
+    """Split data by year, appending each chunk's rows to that year's file"""
+    
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.yearly_rows = {}
+    
+    def output_file(self, year):
+        return os.path.join(self.output_dir, f'customer_data_{year}.csv')
+    
+    def add(self, chunk):
+        # Group by year and append; the first write of a year replaces any
+        # earlier file and carries the header
+        for year, year_data in chunk.groupby(chunk['AC_OPEN_DATE'].dt.year):
             if pd.notna(year):
-                if year not in yearly_data:
-                    yearly_data[year] = []
-                yearly_data[year].append(year_data.drop('year', axis=1))
-        
-        # Progress update
-        processed = min((i + 1) * chunk_size, total_rows)
-        print(f"  Processed {processed:,} / {total_rows:,} rows ({processed/total_rows*100:.1f}%)", end='\r')
-    
-    print()  # New line after progress
-    
-    # Save yearly files
-    for year, data_list in yearly_data.items():
-        year_df = pd.concat(data_list, ignore_index=True)
-        output_file = os.path.join(output_dir, f'customer_data_{int(year)}.csv')
-        year_df.to_csv(output_file, index=False)
-        print(f"  Saved {int(year)}: {len(year_df):,} rows -> {output_file}")
-
-
-def create_sample_file(input_file, output_dir, sample_size=100000):
-    """Create a random sample of the data"""
-    # Read random sample
-    # First, get total rows
-    total_rows = sum(1 for line in open(input_file, 'r', encoding='utf-8')) - 1
-    
-    # Calculate skip rows for random sampling
-    if total_rows > sample_size:
-        skip_rows = sorted(np.random.choice(range(1, total_rows), 
-                                          total_rows - sample_size, 
-                                          replace=False))
-        df_sample = pd.read_csv(input_file, skiprows=skip_rows)
-    else:
-        df_sample = pd.read_csv(input_file)
+                year = int(year)
+                first_write = year not in self.yearly_rows
+                year_data.to_csv(self.output_file(year), mode='w' if first_write else 'a',
+                                 header=first_write, index=False)
+                self.yearly_rows[year] = self.yearly_rows.get(year, 0) + len(year_data)
+    
+    def close(self):
+        for year, rows in self.yearly_rows.items():
+            print(f"  Saved {year}: {rows:,} rows -> {self.output_file(year)}")
+
+
+# Columns the summary aggregates, the only ones shipped to its workers, and
+# the compact numeric types its measures are cast to there (they are read as
+# text for the pass-through outputs): AGE as float32, since ages stored as
+# 52.0 would not parse as integers, and the balance as float64 so its sums
+# keep cents
+SUMMARY_COLUMNS = ['REGION_DESC', 'AC_OPEN_DATE', 'CUSTOMER_NO', 'INET_ELIGIBLE', 'AGE',
+                   'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'MOBILE_APP_REGISTRATION_DATE']
+NUMERIC_TYPES = {'AGE': np.float32, 'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE': np.float64}
+
+
+def summarize_chunk(chunk, date_formats):
+    """Per-chunk partial summary; module level so it can run in a worker process"""
+    # Numeric measures, a month column, a categorical region key and 0/1
+    # indicator columns, so every aggregation below is a built-in reducer
+    # rather than a per-group lambda
+    chunk = chunk.assign(
+        REGION_DESC=chunk['REGION_DESC'].astype('category'),
+        **{col: pd.to_numeric(chunk[col], errors='coerce').astype(dtype) for col, dtype in NUMERIC_TYPES.items()},
+        year_month=chunk['AC_OPEN_DATE'].dt.to_period('M'),
+        _inet_y=(chunk['INET_ELIGIBLE'] == 'Y').to_numpy().astype(np.int32),
+        _mob_reg=parse_dates(chunk['MOBILE_APP_REGISTRATION_DATE'], date_formats).notna().to_numpy().astype(np.int32)
+    )
     
-    # Save sample
-    output_file = os.path.join(output_dir, 'customer_data_sample.csv')
-    df_sample.to_csv(output_file, index=False)
-    print(f"  Saved sample: {len(df_sample):,} rows -> {output_file}")
+    # Aggregate by region and month to sums and counts, which add up exactly
+    # across chunks, so the means can be finished after the combine
+    return chunk.groupby(['REGION_DESC', 'year_month'], observed=True, sort=False).agg(
+        total_customers=('CUSTOMER_NO', 'count'),
+        inet_eligible=('_inet_y', 'sum'),
+        registered=('_mob_reg', 'sum'),
+        age_sum=('AGE', 'sum'),
+        age_count=('AGE', 'count'),
+        median_age=('AGE', 'median'),
+        balance_sum=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'sum'),
+        balance_count=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'count'),
+        median_balance=('CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE', 'median')
+    ).reset_index()
 
 
-def create_summary_stats(input_file, output_dir):
+class SummaryAggregator:
     """Create aggregated summary statistics"""
-    chunk_size = 50000
-    summary_data = []
     
-    for chunk in pd.read_csv(input_file, chunksize=chunk_size):
-        # Convert dates
-        chunk['AC_OPEN_DATE'] = pd.to_datetime(chunk['AC_OPEN_DATE'], errors='coerce')
-        chunk['MOBILE_APP_REGISTRATION_DATE'] = pd.to_datetime(chunk['MOBILE_APP_REGISTRATION_DATE'], errors='coerce')
+    def __init__(self, output_dir, executor=None, max_pending=4):
+        self.output_dir = output_dir
+        self.executor = executor
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.summary_data = []
+        # Date formats for the summary's own date column. A worker gets a copy,
+        # so formats it guesses stay with that chunk
+        self.date_formats = {}
+    
+    def add(self, chunk):
+        chunk = chunk[SUMMARY_COLUMNS]
+        if self.executor is None:
+            self.summary_data.append(summarize_chunk(chunk, self.date_formats))
+            return
         
-        # Create month column
-        chunk['year_month'] = chunk['AC_OPEN_DATE'].dt.to_period('M')
+        # Chunks are summarized in worker processes while the main process
+        # goes on writing the yearly and recent files; the oldest results are
+        # collected first so only a few chunks are in flight at a time
+        while len(self.pending) >= self.max_pending:
+            self.summary_data.append(self.pending.popleft().result())
+        self.pending.append(self.executor.submit(summarize_chunk, chunk, self.date_formats))
+    
+    def close(self):
+        self.summary_data.extend(future.result() for future in self.pending)
+        self.pending.clear()
         
-        # Aggregate by region and month
-        summary = chunk.groupby(['REGION_DESC', 'year_month']).agg({
-            'CUSTOMER_NO': 'count',
-            'INET_ELIGIBLE': lambda x: (x == 'Y').sum(),
-            'MOBILE_APP_REGISTRATION_DATE': lambda x: x.notna().sum(),
-            'AGE': ['mean', 'median'],
-            'CUSTOMER_MTD_AVERAGE_ALL_ACTIVE_ELIGIBLE': ['mean', 'median']
-        }).reset_index()
+        # Combine all summaries: counts and sums add, while medians do not
+        # decompose, so they are the average of the per-chunk medians. Regions
+        # are grouped as plain labels, since each chunk's categories are in
+        # first-seen order and the output is sorted alphabetically
+        final_summary = pd.concat(self.summary_data, ignore_index=True).astype({'REGION_DESC': str}).groupby(
+            ['REGION_DESC', 'year_month'], observed=True
+        ).agg(
+            total_customers=('total_customers', 'sum'),
+            inet_eligible=('inet_eligible', 'sum'),
+            registered=('registered', 'sum'),
+            age_sum=('age_sum', 'sum'),
+            age_count=('age_count', 'sum'),
+            median_age=('median_age', 'mean'),
+            balance_sum=('balance_sum', 'sum'),
+            balance_count=('balance_count', 'sum'),
+            median_balance=('median_balance', 'mean')
+        ).reset_index()
         
-        summary_data.append(summary)
-    
-    # Combine all summaries
-    final_summary = pd.concat(summary_data, ignore_index=True)
-    
-    # Group again to get final aggregation
-    final_summary = final_summary.groupby(['REGION_DESC', 'year_month']).sum().reset_index()
-    
-    # Save summary
-    output_file = os.path.join(output_dir, 'customer_summary_stats.csv')
-    final_summary.to_csv(output_file, index=False)
-    print(f"  Saved summary statistics -> {output_file}")
+        # Means from the combined sums and counts
+        final_summary['avg_age'] = final_summary['age_sum'] / final_summary['age_count']
+        final_summary['avg_balance'] = final_summary['balance_sum'] / final_summary['balance_count']
+        final_summary = final_summary[['REGION_DESC', 'year_month', 'total_customers', 'inet_eligible',
+                                       'registered', 'avg_age', 'median_age', 'avg_balance', 'median_balance']]
+        
+        # Save summary
+        output_file = os.path.join(self.output_dir, 'customer_summary_stats.csv')
+        final_summary.to_csv(output_file, index=False)
+        print(f"  Saved summary statistics -> {output_file}")
 
 
-def create_recent_data_file(input_file, output_dir, years_back=2):
-    """Create file with only recent years data"""
-    chunk_size = 50000
-    recent_data = []
-    cutoff_date = pd.Timestamp.now() - pd.DateOffset(years=years_back)
+class RecentFilterWriter:
+    """Create file with only recent years data, appending it chunk by chunk"""
     
-    for chunk in pd.read_csv(input_file, chunksize=chunk_size):
-        # Convert date
-        chunk['AC_OPEN_DATE'] = pd.to_datetime(chunk['AC_OPEN_DATE'], errors='coerce')
-        
+    def __init__(self, output_dir, years_back=2):
+        self.output_file = os.path.join(output_dir, f'customer_data_last_{years_back}_years.csv')
+        self.cutoff_date = pd.Timestamp.now() - pd.DateOffset(years=years_back)
+        self.rows = 0
+    
+    def add(self, chunk):
         # Filter recent data
-        recent_chunk = chunk[chunk['AC_OPEN_DATE'] >= cutoff_date]
+        recent_chunk = chunk[chunk['AC_OPEN_DATE'] >= self.cutoff_date]
         if len(recent_chunk) > 0:
-            recent_data.append(recent_chunk)
+            recent_chunk.to_csv(self.output_file, mode='w' if self.rows == 0 else 'a',
+                                header=self.rows == 0, index=False)
+            self.rows += len(recent_chunk)
     
-    # Combine and save
-    if recent_data:
-        final_recent = pd.concat(recent_data, ignore_index=True)
-        output_file = os.path.join(output_dir, f'customer_data_last_{years_back}_years.csv')
-        final_recent.to_csv(output_file, index=False)
-        print(f"  Saved recent data: {len(final_recent):,} rows -> {output_file}")
+    def close(self):
+        if self.rows:
+            print(f"  Saved recent data: {self.rows:,} rows -> {self.output_file}")
+
+
+def count_lines(input_file, block_size=1 << 20):
+    """Data rows in the file, counted as newline bytes over a read-only memory map"""
+    if os.path.getsize(input_file) == 0:
+        return 0
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # The scan is front to back, so let the OS read ahead aggressively
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        # mmap has no count(), so it is scanned in 1 MiB slices
+        lines = sum(mm[start:start + block_size].count(b'\n') for start in range(0, len(mm), block_size))
+        # A last line without a trailing newline still counts; the header does not
+        return lines + (mm[-1:] != b'\n') - 1
+
+
+def read_header(input_file):
+    """Column names from the file's first line, without starting a CSV parse"""
+    if os.path.getsize(input_file) == 0:
+        return []
+    with open(input_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = mm.find(b'\n')
+        header = mm[:end if end != -1 else len(mm)]
+    return next(csv.reader([header.decode('utf-8-sig').rstrip('\r')]))
+
+
+def suggest_dtypes(df_sample):
+    """Narrowest dtype each column of the sample fits: small integers and categories"""
+    dtypes = {}
+    for col in df_sample.columns:
+        values = df_sample[col]
+        kind = pd.api.types.infer_dtype(values, skipna=True)
+        non_null = values.dropna()
+        if kind in ('integer', 'floating', 'mixed-integer-float') and len(non_null) and (non_null % 1 == 0).all():
+            for dtype in (np.int8, np.int16, np.int32, np.int64):
+                info = np.iinfo(dtype)
+                if info.min <= non_null.min() and non_null.max() <= info.max:
+                    name = np.dtype(dtype).name
+                    # Nullable integer ('Int8', ...) when the column has gaps
+                    dtypes[col] = name.capitalize() if values.isna().any() else name
+                    break
+        elif kind == 'string' and values.nunique() <= len(values) // 2:
+            dtypes[col] = 'category'
+    # Only the columns that would change
+    return {col: dtype for col, dtype in dtypes.items() if dtype != df_sample[col].dtype.name}
 
 
 def analyze_file_structure(input_file):
@@ -176,6 +368,16 @@ def analyze_file_structure(input_file):
         null_count = df_sample[col].isnull().sum()
         print(f"  - {col}: {dtype} (nulls: {null_count})")
     
+    # Narrower dtypes the sample fits in, and what they would save
+    dtypes = suggest_dtypes(df_sample)
+    if dtypes:
+        print("\nSuggested dtypes:")
+        for col, dtype in dtypes.items():
+            print(f"  - {col}: {df_sample[col].dtype} -> {dtype}")
+        current_memory = df_sample.memory_usage(deep=True).sum()
+        narrowed_memory = df_sample.astype(dtypes).memory_usage(deep=True).sum()
+        print(f"Estimated memory saving: {(1 - narrowed_memory / current_memory) * 100:.0f}%")
+    
     # Date columns
     date_cols = ['CIF_CREATION_DATE', 'CUSTOMER_RELATIONSHIP_DATE', 'AC_OPEN_DATE', 
                  'MOBILE_APP_REGISTRATION_DATE', 'LAST_TRX_DATE']
@@ -193,7 +395,7 @@ def analyze_file_structure(input_file):
     memory_per_row = df_sample.memory_usage(deep=True).sum() / len(df_sample)
     print(f"\nEstimated memory per row: {memory_per_row:.0f} bytes")
     
-    total_rows = sum(1 for line in open(input_file, 'r', encoding='utf-8')) - 1
+    total_rows = count_lines(input_file)
     estimated_memory = (memory_per_row * total_rows) / (1024**3)
     print(f"Estimated total memory needed: {estimated_memory:.2f} GB")
 
@@ -203,6 +405,8 @@ if __name__ == "__main__":
     parser.add_argument('input_file', help='Path to the large CSV file')
     parser.add_argument('--output-dir', default='./processed_data', 
                        help='Output directory for processed files')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Worker processes for the summary statistics (default: half the CPU cores)')
     parser.add_argument('--analyze-only', action='store_true',
                        help='Only analyze file structure without processing')
     
@@ -215,7 +419,7 @@ if __name__ == "__main__":
     if args.analyze_only:
         analyze_file_structure(args.input_file)
     else:
-        preprocess_large_csv(args.input_file, args.output_dir)
+        preprocess_large_csv(args.input_file, args.output_dir, args.workers)
 
 
 # Example usage: